@@ -0,0 +1,214 @@
+import sqlite3
+import threading
+import time
+
+from config import (
+    ACTIVITY_DB_PATH, ACTIVITY_RAW_RETENTION,
+    ACTIVITY_MINUTE_RETENTION, ACTIVITY_HOUR_RETENTION, ACTIVITY_FLUSH_INTERVAL
+)
+
+MINUTE = 60
+HOUR = 3600
+RETENTION = {MINUTE: ACTIVITY_MINUTE_RETENTION, HOUR: ACTIVITY_HOUR_RETENTION}
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS activity ("
+    "id INTEGER PRIMARY KEY, user TEXT NOT NULL, ts REAL NOT NULL, app TEXT, "
+    "activity TEXT, state TEXT, stuck INTEGER NOT NULL, stress REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS activity_user_ts ON activity (user, ts)",
+    "CREATE INDEX IF NOT EXISTS activity_user_app_ts ON activity (user, app, ts)",
+    "CREATE INDEX IF NOT EXISTS activity_user_state_ts ON activity (user, state, ts)",
+    "CREATE TABLE IF NOT EXISTS activity_rollup ("
+    "user TEXT NOT NULL, size INTEGER NOT NULL, bucket INTEGER NOT NULL, "
+    "app TEXT NOT NULL, state TEXT NOT NULL, n INTEGER NOT NULL, stuck INTEGER NOT NULL, "
+    "stress_sum REAL NOT NULL, stress_max REAL NOT NULL, "
+    "PRIMARY KEY (user, size, bucket, app, state))",
+    "CREATE INDEX IF NOT EXISTS activity_rollup_app ON activity_rollup (user, size, app, bucket)",
+    "CREATE INDEX IF NOT EXISTS activity_rollup_state ON activity_rollup (user, size, state, bucket)",
+)
+
+UPSERT_ROLLUP = (
+    "INSERT INTO activity_rollup (user, size, bucket, app, state, n, stuck, stress_sum, stress_max) "
+    "VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?) "
+    "ON CONFLICT (user, size, bucket, app, state) DO UPDATE SET "
+    "n = n + 1, stuck = stuck + excluded.stuck, stress_sum = stress_sum + excluded.stress_sum, "
+    "stress_max = MAX(stress_max, excluded.stress_max)"
+)
+
+
+def start_of_today(now = None):
+    now = time.time() if now is None else now
+    local = time.localtime(now)
+    return time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1))
+
+
+class ActivityStore:
+    def __init__(self, path = ACTIVITY_DB_PATH):
+        self.lock = threading.Lock()
+        self.db = None
+        self.writes = 0
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.thread = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        try:
+            self.db = sqlite3.connect(path, check_same_thread = False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                self.db.execute(statement)
+            self.db.commit()
+            self._prune(time.time())
+        except sqlite3.Error as e:
+            print(f"[activity_store] Activity history disabled: {e}")
+            self.db = None
+            return
+        self.thread = threading.Thread(target = self._loop, daemon = True)
+        self.thread.start()
+
+    def record(self, user_id, timestamp, app, activity, state, stuck, stress):
+        # called on the event loop: only queue the row, the writer thread commits it
+        if self.db is None:
+            return
+        row = (user_id, timestamp, app or "unknown", activity, state or "UNKNOWN", int(bool(stuck)), float(stress or 0))
+        with self.pending_lock:
+            self.pending.append(row)
+
+    def _loop(self):
+        while True:
+            time.sleep(ACTIVITY_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        with self.pending_lock:
+            rows, self.pending = self.pending, []
+        if not rows or self.db is None:
+            return
+        with self.lock:
+            try:
+                self.db.executemany(
+                    "INSERT INTO activity (user, ts, app, activity, state, stuck, stress) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self.db.executemany(UPSERT_ROLLUP, [
+                    (user_id, size, int(ts // size * size), app, state, stuck, stress, stress)
+                    for user_id, ts, app, _, state, stuck, stress in rows
+                    for size in (MINUTE, HOUR)
+                ])
+                self.db.commit()
+                before = self.writes
+                self.writes += len(rows)
+                if self.writes // 500 > before // 500:
+                    self._prune(rows[-1][1])
+            except sqlite3.Error as e:
+                self.db.rollback()
+                print(f"[activity_store] Write of {len(rows)} rows failed: {e}")
+
+    def _prune(self, now):
+        self.db.execute("DELETE FROM activity WHERE ts < ?", (now - ACTIVITY_RAW_RETENTION,))
+        for size, keep in RETENTION.items():
+            self.db.execute("DELETE FROM activity_rollup WHERE size = ? AND bucket < ?", (size, now - keep))
+        self.db.commit()
+
+    def _size_for(self, since, until):
+        # minute buckets only exist for the recent past and only pay off for short ranges
+        if until - since <= 6 * HOUR and since >= time.time() - ACTIVITY_MINUTE_RETENTION:
+            return MINUTE
+        return HOUR
+
+    def summary(self, user_id, since, until = None):
+        until = time.time() if until is None else until
+        empty = {"since": since, "until": until, "analyses": 0, "stuck": 0,
+                 "avg_stress": 0, "peak_stress": 0, "apps": {}, "states": {}}
+        if self.db is None:
+            return empty
+        size = self._size_for(since, until)
+        self.flush()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT app, state, SUM(n), SUM(stuck), SUM(stress_sum), MAX(stress_max) "
+                "FROM activity_rollup WHERE user = ? AND size = ? AND bucket >= ? AND bucket < ? "
+                "GROUP BY app, state",
+                (user_id, size, int(since // size * size), until)
+            ).fetchall()
+        if not rows:
+            return empty
+        apps = {}
+        states = {}
+        total = stuck = 0
+        stress_sum = peak = 0.0
+        for app, state, n, n_stuck, s_sum, s_max in rows:
+            apps[app] = apps.get(app, 0) + n
+            states[state] = states.get(state, 0) + n
+            total += n
+            stuck += n_stuck
+            stress_sum += s_sum
+            peak = max(peak, s_max)
+        return {
+            "since": since,
+            "until": until,
+            "analyses": total,
+            "stuck": stuck,
+            "avg_stress": round(stress_sum / total, 2),
+            "peak_stress": round(peak, 2),
+            "apps": apps,
+            "states": states
+        }
+
+    def timeline(self, user_id, since, until = None, size = None, app = None, state = None):
+        until = time.time() if until is None else until
+        if self.db is None:
+            return []
+        size = size or self._size_for(since, until)
+        query = ("SELECT bucket, SUM(n), SUM(stuck), SUM(stress_sum), MAX(stress_max) FROM activity_rollup "
+                 "WHERE user = ? AND size = ? AND bucket >= ? AND bucket < ?")
+        params = [user_id, size, int(since // size * size), until]
+        if app:
+            query += " AND app = ?"
+            params.append(app)
+        if state:
+            query += " AND state = ?"
+            params.append(state)
+        query += " GROUP BY bucket ORDER BY bucket"
+        self.flush()
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [
+            {"bucket": bucket, "size": size, "analyses": n, "stuck": n_stuck,
+             "avg_stress": round(s_sum / n, 2), "peak_stress": round(s_max, 2)}
+            for bucket, n, n_stuck, s_sum, s_max in rows
+        ]
+
+    def entries(self, user_id, since, until = None, app = None, state = None, limit = 200):
+        until = time.time() if until is None else until
+        if self.db is None:
+            return []
+        query = "SELECT ts, app, activity, state, stuck, stress FROM activity WHERE user = ? AND ts >= ? AND ts < ?"
+        params = [user_id, since, until]
+        if app:
+            query += " AND app = ?"
+            params.append(app)
+        if state:
+            query += " AND state = ?"
+            params.append(state)
+        query += " ORDER BY ts DESC LIMIT ?"
+        params.append(limit)
+        self.flush()
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [
+            {"timestamp": ts, "app": app_, "activity": activity, "state": state_, "stuck": bool(stuck), "estimated_stress": stress}
+            for ts, app_, activity, state_, stuck, stress in rows
+        ]
+
+
+_store = None
+
+def get_activity_store():
+    global _store
+    if _store is None:
+        _store = ActivityStore()
+    return _store
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_PATH
+
+CACHE_KEY_FIELDS = ("language", "url", "shell", "platform")
+
+
+def normalize_content(content):
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def content_digest(content):
+    return hashlib.blake2b(normalize_content(content).encode("utf-8"), digest_size = 16).hexdigest()
+
+
+def analysis_key(app_type, content, kwargs = None, state_bucket = None, extra = None):
+    kwargs = kwargs or {}
+    h = hashlib.blake2b(digest_size = 20)
+    h.update(f"{app_type}\0{state_bucket or ''}\0{extra or ''}\0".encode("utf-8"))
+    for field in CACHE_KEY_FIELDS:
+        h.update(f"{field}={kwargs.get(field) or ''}\0".encode("utf-8"))
+    h.update(normalize_content(content).encode("utf-8"))
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, max_entries = ANALYSIS_CACHE_SIZE, ttl = ANALYSIS_CACHE_TTL, path = ANALYSIS_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.db = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        try:
+            self.db = sqlite3.connect(path, check_same_thread = False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "key TEXT PRIMARY KEY, created REAL NOT NULL, analysis TEXT NOT NULL)"
+            )
+            self.db.execute("DELETE FROM analyses WHERE created < ?", (time.time() - self.ttl,))
+            self.db.commit()
+        except sqlite3.Error as e:
+            print(f"[analysis_cache] Disk cache disabled: {e}")
+            self.db = None
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                created, analysis = entry
+                if now - created < self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(analysis)
+                del self.entries[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT created, analysis FROM analyses WHERE key = ? AND created >= ?",
+                    (key, now - self.ttl)
+                ).fetchone()
+                if row:
+                    created, analysis = row[0], json.loads(row[1])
+                    self._remember(key, created, analysis)
+                    self.hits += 1
+                    return dict(analysis)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, analysis):
+        now = time.time()
+        with self.lock:
+            self._remember(key, now, dict(analysis))
+            if self.db is not None:
+                try:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO analyses (key, created, analysis) VALUES (?, ?, ?)",
+                        (key, now, json.dumps(analysis))
+                    )
+                    self.writes += 1
+                    if self.writes % 256 == 0:
+                        self.db.execute("DELETE FROM analyses WHERE created < ?", (now - self.ttl,))
+                    self.db.commit()
+                except sqlite3.Error as e:
+                    print(f"[analysis_cache] Write failed: {e}")
+
+    def _remember(self, key, created, analysis):
+        self.entries[key] = (created, analysis)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last = False)
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+
+def get_analysis_cache():
+    global _cache
+    if _cache is None:
+        _cache = AnalysisCache()
+    return _cache
@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import websockets
+
+from stub_llm import start_stub
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_CODE = """def calculate_total(items):
+    total = 0
+    for item in items:
+        total += item.price
+    return total
+
+result = calculate_total(fetch_cart({n}))
+print(result)
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class ProcessSampler:
+    def __init__(self, pid):
+        self.pid = pid
+        self.samples = []
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.page = os.sysconf("SC_PAGE_SIZE")
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self.ticks
+        rss = int(fields[21]) * self.page
+        return time.monotonic(), cpu_seconds, rss
+
+    async def run(self, interval = 0.5):
+        while True:
+            try:
+                self.samples.append(self._read())
+            except (OSError, IndexError):
+                return
+            await asyncio.sleep(interval)
+
+    def summary(self):
+        if len(self.samples) < 2:
+            return {}
+        t0, c0, _ = self.samples[0]
+        t1, c1, _ = self.samples[-1]
+        rss = [s[2] for s in self.samples]
+        return {
+            "cpu_percent": round(100 * (c1 - c0) / (t1 - t0), 1),
+            "rss_mb_peak": round(max(rss) / 2**20, 1),
+            "rss_mb_end": round(rss[-1] / 2**20, 1),
+        }
+
+
+class ClientStats:
+    def __init__(self):
+        self.first_frame = []
+        self.full_intervention = []
+        self.bio_intervals = []
+        self.timeouts = 0
+        self.sent = {"content_update": 0, "live_hr": 0, "feedback": 0}
+        self.received = 0
+
+
+async def run_client(idx, port, args, stats, deadline):
+    uri = f"ws://127.0.0.1:{port}/ws?user=bench{idx}"
+    waiting = {}
+    async with websockets.connect(uri, max_size = None) as ws:
+
+        async def receiver():
+            last_bio = None
+            async for raw in ws:
+                stats.received += 1
+                msg = json.loads(raw)
+                kind = msg.get("type")
+                now = time.perf_counter()
+                if kind == "biometric_update":
+                    if last_bio is not None:
+                        stats.bio_intervals.append(now - last_bio)
+                    last_bio = now
+                elif kind in ("intervention", "intervention_start") and "sent" in waiting and "first" not in waiting:
+                    waiting["first"] = now
+                    stats.first_frame.append(now - waiting["sent"])
+                if kind in ("intervention", "intervention_end") and "sent" in waiting:
+                    stats.full_intervention.append(now - waiting["sent"])
+                    waiting["done"].set()
+
+        async def heart_rate():
+            hr = random.uniform(64, 74)
+            while time.monotonic() < deadline:
+                hr = max(60, min(80, hr + random.uniform(-1.5, 1.5)))
+                await ws.send(json.dumps({"type": "live_hr", "heart_rate": round(hr)}))
+                stats.sent["live_hr"] += 1
+                await asyncio.sleep(1 / args.hr_rate)
+
+        recv_task = asyncio.create_task(receiver())
+        hr_task = asyncio.create_task(heart_rate())
+        await asyncio.sleep(random.uniform(0, args.content_interval))
+        n = 0
+        try:
+            while time.monotonic() < deadline:
+                n += 1
+                # mock_state clears the per-session cooldowns so every update can intervene
+                await ws.send(json.dumps({"type": "mock_state", "state": 4}))
+                waiting.clear()
+                waiting["done"] = asyncio.Event()
+                waiting["sent"] = time.perf_counter()
+                await ws.send(json.dumps({
+                    "type": "content_update",
+                    "app_type": "code",
+                    "content": SAMPLE_CODE.format(n = f"{idx}-{n}"),
+                    "language": "python",
+                    "cursor_line": 4
+                }))
+                stats.sent["content_update"] += 1
+                try:
+                    await asyncio.wait_for(waiting["done"].wait(), args.timeout)
+                    if random.random() < args.feedback_rate:
+                        await ws.send(json.dumps({"type": "feedback", "action": random.choice(["Thanks", "Not Now"])}))
+                        stats.sent["feedback"] += 1
+                except asyncio.TimeoutError:
+                    stats.timeouts += 1
+                await asyncio.sleep(args.content_interval)
+        finally:
+            hr_task.cancel()
+            recv_task.cancel()
+
+
+def wait_for_server(port, timeout = 30):
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout = 1) as resp:
+                if resp.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def fmt_ms(value):
+    return "—" if value is None else f"{value * 1000:.1f}"
+
+
+def build_report(args, stats, sampler, elapsed):
+    bio = stats.bio_intervals
+    report = {
+        "clients": args.clients,
+        "duration_s": round(elapsed, 1),
+        "llm_latency_s": args.llm_latency,
+        "fused": args.fused,
+        "sent": stats.sent,
+        "frames_received": stats.received,
+        "interventions": len(stats.full_intervention),
+        "timeouts": stats.timeouts,
+        "first_frame_ms": {p: fmt_ms(percentile(stats.first_frame, p)) for p in (50, 95, 99)},
+        "intervention_ms": {p: fmt_ms(percentile(stats.full_intervention, p)) for p in (50, 95, 99)},
+        "biometric_interval_ms": {
+            "mean": fmt_ms(statistics.mean(bio)) if bio else "—",
+            "jitter_stdev": fmt_ms(statistics.pstdev(bio)) if len(bio) > 1 else "—",
+            "p99": fmt_ms(percentile(bio, 99)),
+        },
+        "server": sampler.summary(),
+    }
+    return report
+
+
+def print_report(report):
+    print()
+    print("=" * 60)
+    print(f" Ghost load test — {report['clients']} clients, {report['duration_s']}s, stub LLM {report['llm_latency_s']}s{', fused' if report['fused'] else ''}")
+    print("=" * 60)
+    print(f"  sent:             {report['sent']}")
+    print(f"  frames received:  {report['frames_received']}")
+    print(f"  interventions:    {report['interventions']} (timeouts: {report['timeouts']})")
+    ff = report["first_frame_ms"]
+    iv = report["intervention_ms"]
+    print(f"  content→first frame ms   p50 {ff[50]}  p95 {ff[95]}  p99 {ff[99]}")
+    print(f"  content→intervention ms  p50 {iv[50]}  p95 {iv[95]}  p99 {iv[99]}")
+    b = report["biometric_interval_ms"]
+    print(f"  biometric_update interval ms  mean {b['mean']}  stdev {b['jitter_stdev']}  p99 {b['p99']}")
+    srv = report["server"]
+    if srv:
+        print(f"  server cpu {srv['cpu_percent']}%  rss peak {srv['rss_mb_peak']} MB  end {srv['rss_mb_end']} MB")
+    print("=" * 60)
+
+
+async def run(args):
+    stub = start_stub(0, args.llm_latency, args.token_delay)
+    stub_port = stub.server_address[1]
+    port = args.port or free_port()
+
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "CLAUDE_API_KEY": "stub-key",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{stub_port}",
+        "ANALYSIS_CACHE_PATH": "",
+        "ACTIVITY_DB_PATH": "",
+        "INTERVENTION_LOG_PATH": "",
+        "FUSED_ANALYSIS": "1" if args.fused else "0",
+    })
+    server = subprocess.Popen(
+        [sys.executable, "server.py"], cwd = HERE, env = env,
+        stdout = subprocess.DEVNULL if not args.verbose else None,
+        stderr = subprocess.STDOUT if not args.verbose else None
+    )
+    try:
+        if not wait_for_server(port):
+            print("[bench] server did not come up")
+            return None
+        sampler = ProcessSampler(server.pid)
+        sampler_task = asyncio.create_task(sampler.run())
+        stats = ClientStats()
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(*(run_client(i, port, args, stats, deadline) for i in range(args.clients)), return_exceptions = True)
+        sampler_task.cancel()
+        return build_report(args, stats, sampler, time.monotonic() - start)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout = 10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        stub.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Load test server.py against a stub LLM with simulated WebSocket clients")
+    parser.add_argument("--clients", type = int, default = 20)
+    parser.add_argument("--duration", type = float, default = 30, help = "seconds of traffic")
+    parser.add_argument("--llm-latency", type = float, default = 0.3, help = "stub time to first byte, seconds")
+    parser.add_argument("--token-delay", type = float, default = 0.02, help = "stub delay between streamed words")
+    parser.add_argument("--content-interval", type = float, default = 2.0, help = "pause between content updates per client")
+    parser.add_argument("--hr-rate", type = float, default = 1.0, help = "live_hr messages per second per client")
+    parser.add_argument("--feedback-rate", type = float, default = 0.5)
+    parser.add_argument("--timeout", type = float, default = 15.0)
+    parser.add_argument("--port", type = int, default = 0)
+    parser.add_argument("--json", help = "also write the report to this file")
+    parser.add_argument("--fused", action = "store_true", help = "run the server with FUSED_ANALYSIS on")
+    parser.add_argument("--verbose", action = "store_true", help = "show server output")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if report is None:
+        sys.exit(1)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent = 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,83 @@
+import asyncio
 import httpx
+import numpy as np
 import time
 import json
 import os
 
+from config import (
+    WHOOP_ENDPOINT_TTL, HRV_BASELINE_WINDOW, LIVE_HR_MAX_AGE,
+    WHOOP_HISTORY_SYNC_INTERVAL, WHOOP_HISTORY_RETRY_INTERVAL
+)
+from whoop_client import get_whoop_client
+from whoop_history import WhoopHistory
+from hr_series import HeartRateSeries
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def as_float_array(values):
+    try:
+        return np.asarray(values, dtype = float)
+    except (TypeError, ValueError):
+        pass
+    # one bad entry shouldn't sink the batch: it becomes NaN and the finite mask drops it
+    try:
+        return np.array([_to_float(v) for v in values], dtype = float)
+    except TypeError:
+        return None
+
+
+def classify_batch(recovery, strain, sleep, hrv, hrv_baseline = 50.0, live_hr = None):
+    recovery = np.asarray(recovery, dtype = float)
+    strain = np.asarray(strain, dtype = float)
+    sleep = np.asarray(sleep, dtype = float)
+    hrv = np.asarray(hrv, dtype = float)
+    baseline = np.broadcast_to(np.asarray(hrv_baseline, dtype = float), hrv.shape)
+    live = np.zeros(hrv.shape) if live_hr is None else np.asarray(live_hr, dtype = float)
+
+    safe_baseline = np.where(baseline > 0, baseline, 1.0)
+    hrv_ratio = np.where(baseline > 0, hrv / safe_baseline, 1.0)
+    stress = np.select(
+        [hrv_ratio < 0.6, hrv_ratio < 0.75, hrv_ratio < 0.85],
+        [2.5, 1.8, 1.2],
+        0.5
+    )
+
+    # live readings under 60 bpm are ignored, same as classify
+    use_live = live >= 60
+    live_state = np.select(
+        [live > 110, live > 95, live > 75],
+        ["STRESSED", "WIRED", "DEEP_FOCUS"],
+        "RELAXED"
+    )
+    live_stress = np.select([live > 110, live > 95, live > 75], [2.5, 1.9, 1.2], 0.5)
+
+    rule_state = np.select(
+        [
+            (recovery < 40) | (sleep < 0.7),
+            (stress >= 2.0) | (strain > 16),
+            (strain > 12) & (recovery < 60),
+            (stress > 0.9) & (stress <= 1.5) & (strain >= 8) & (strain <= 14) & (recovery > 60),
+        ],
+        ["FATIGUED", "STRESSED", "WIRED", "DEEP_FOCUS"],
+        "RELAXED"
+    )
+
+    states = np.where(use_live, live_state, rule_state)
+    stress = np.where(use_live, live_stress, stress)
+    return states, stress
+
+
 class BiometricEngine:
     TOKENS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".whoop_tokens.json")
+    HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".whoop_history.json")
 
-    def __init__ (self, client_id = None, client_secret = None):
+    def __init__ (self, client_id = None, client_secret = None, tokens_file = None, history_file = None):
         self.client_id = client_id
         self.client_secret = client_secret
         self.access_token = None
@@ -23,19 +94,26 @@ class BiometricEngine:
         self._sleep_error_logged = False
         self.live_heart_rate = 0
         self.live_hr_timestamp = 0
+        self.hr_series = HeartRateSeries()
+        self.endpoint_cache = {}
+        if tokens_file:
+            self.TOKENS_FILE = tokens_file
+        self.history = WhoopHistory(history_file or self.HISTORY_FILE)
+        self.next_history_sync = 0
+        self._refresh_baseline()
         self._load_tokens()
 
     AUTH_URL = "https://api.prod.whoop.com/oauth/oauth2/auth"
     TOKEN_URL = "https://api.prod.whoop.com/oauth/oauth2/token"
     API_BASE = "https://api.prod.whoop.com/developer/v2"
 
-    def get_auth_url(self, redirect_uri):
+    def get_auth_url(self, redirect_uri, state = "devlife_whoop_auth_2026"):
         params = {
             "client_id": self.client_id,
             "redirect_uri": redirect_uri,
             "response_type": "code",
             "scope": "read:recovery read:cycles read:sleep read:profile",
-            "state": "devlife_whoop_auth_2026"
+            "state": state
         }
         query = "&".join(f"{k}={v}" for k, v in params.items())
         return f"{self.AUTH_URL}?{query}"
@@ -101,52 +179,127 @@ class BiometricEngine:
             return self.refresh_access_token()
         return self.access_token is not None
 
+    def add_live_hr(self, heart_rate, rr = None, timestamp = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        self.hr_series.append(heart_rate, rr, timestamp)
+        self.live_heart_rate = heart_rate
+        self.live_hr_timestamp = timestamp
+
+    def add_live_hr_batch(self, timestamps, heart_rates, rr = None, now = None):
+        now = time.time() if now is None else now
+        ts = as_float_array(timestamps)
+        hr = as_float_array(heart_rates)
+        if ts is None or hr is None or hr.ndim != 1 or ts.shape != hr.shape or len(hr) == 0:
+            return 0
+        valid = np.isfinite(ts) & np.isfinite(hr) & (hr > 30) & (hr < 220)
+        if not valid.any():
+            return 0
+        last = ts[valid][-1]
+        if last > 1e11:
+            ts = ts / 1000.0
+            last /= 1000.0
+        # keep the sender's sample spacing but not its clock
+        skew = now - last
+        if abs(skew) > LIVE_HR_MAX_AGE:
+            ts = ts + skew
+
+        rr_ts = rr_values = None
+        if isinstance(rr, list) and len(rr) == len(hr):
+            counts = [len(r) if isinstance(r, list) and valid[i] else 0 for i, r in enumerate(rr)]
+            if sum(counts):
+                rr_values = as_float_array([v for i, r in enumerate(rr) if counts[i] for v in r])
+                if rr_values is not None:
+                    rr_ts = np.repeat(ts, counts)
+                    rr_ok = (rr_values >= 250) & (rr_values <= 2500)
+                    rr_ts, rr_values = rr_ts[rr_ok], rr_values[rr_ok]
+
+        ts, hr = ts[valid], hr[valid]
+        self.hr_series.extend(ts, hr, rr_ts, rr_values)
+        self.live_heart_rate = int(round(hr[-1]))
+        self.live_hr_timestamp = float(ts[-1])
+        return len(hr)
+
     def update_baseline(self, hrv_value):
         self.hrv_history.append(hrv_value)
-        if len(self.hrv_history) > 14:
+        if len(self.hrv_history) > HRV_BASELINE_WINDOW:
             self.hrv_history.pop(0)
         if self.hrv_history:
             self.hrv_baseline = sum(self.hrv_history) / len(self.hrv_history)
 
-    def fetch_data(self):
+    def _refresh_baseline(self, current_hrv = None):
+        daily = self.history.daily_hrv(HRV_BASELINE_WINDOW)
+        if not daily and current_hrv:
+            # nothing synced yet: today's reading is the best estimate
+            daily = [current_hrv]
+        if daily:
+            self.hrv_history = daily
+            self.hrv_baseline = sum(daily) / len(daily)
+
+    async def sync_history(self):
+        if not self.access_token or time.time() < self.next_history_sync:
+            return
+        try:
+            complete = await self.history.sync(get_whoop_client(), self.API_BASE, self.access_token)
+        except Exception as e:
+            print(f"[whoop] History sync failed: {e}")
+            complete = False
+        self.next_history_sync = time.time() + (WHOOP_HISTORY_SYNC_INTERVAL if complete else WHOOP_HISTORY_RETRY_INTERVAL)
+
+    async def _fetch_endpoint(self, endpoint):
+        now = time.time()
+        cached = self.endpoint_cache.get(endpoint)
+        if cached and now - cached[0] < WHOOP_ENDPOINT_TTL.get(endpoint, 60):
+            return 200, cached[1]
+        response = await get_whoop_client().get(f"{self.API_BASE}/{endpoint}", self.access_token, params={"limit": 1})
+        # out of budget or throttled: serve the last good payload if there is one
+        if response is None or response.status_code == 429:
+            return (200, cached[1]) if cached else (429, None)
+        if response.status_code == 200:
+            data = response.json()
+            self.endpoint_cache[endpoint] = (now, data)
+            return 200, data
+        return response.status_code, None
+
+    async def fetch_data(self):
         if not self.access_token:
             return None
-        self.ensure_token_valid()
-        headers = {"Authorization": f"Bearer {self.access_token}"}
+        if time.time() >= self.token_expiry - 60:
+            await asyncio.to_thread(self.ensure_token_valid)
         try:
-            recovery_resp = httpx.get(f"{self.API_BASE}/recovery", headers=headers, params={"limit": 1})
-            if recovery_resp.status_code == 401:
-                print("[bio] Token expired — need to re-authenticate")
-                self.access_token = None
-                return None
-            if recovery_resp.status_code < 200 or recovery_resp.status_code >= 300:
-                print(f"[bio] Recovery API error: HTTP {recovery_resp.status_code}")
-                return None
-            recovery_data = recovery_resp.json()
-
-            cycle_resp = httpx.get(f"{self.API_BASE}/cycle", headers=headers, params={"limit": 1})
-            if cycle_resp.status_code == 401:
-                print("[bio] Token expired — need to re-authenticate")
-                self.access_token = None
-                return None
-            if cycle_resp.status_code < 200 or cycle_resp.status_code >= 300:
-                print(f"[bio] Cycle API error: HTTP {cycle_resp.status_code}")
-                return None
-            cycle_data = cycle_resp.json()
+            results = await asyncio.gather(
+                self._fetch_endpoint("recovery"),
+                self._fetch_endpoint("cycle"),
+                self._fetch_endpoint("activity/sleep"),
+                return_exceptions=True
+            )
+            for name, result in zip(("Recovery", "Cycle"), results[:2]):
+                if isinstance(result, Exception):
+                    raise result
+                status, _ = result
+                if status == 401:
+                    print("[bio] Token expired — need to re-authenticate")
+                    self.access_token = None
+                    self.endpoint_cache.clear()
+                    return None
+                if status == 429:
+                    return self.current_data
+                if status < 200 or status >= 300:
+                    print(f"[bio] {name} API error: HTTP {status}")
+                    return None
+            recovery_data = results[0][1]
+            cycle_data = results[1][1]
 
             sleep_data = None
-            try:
-                sleep_resp = httpx.get(f"{self.API_BASE}/activity/sleep", headers=headers, params={"limit": 1})
-                if sleep_resp.status_code == 200:
-                    sleep_data = sleep_resp.json()
-                    self._sleep_error_logged = False
-                elif not self._sleep_error_logged:
-                    print(f"[bio] Sleep API returned HTTP {sleep_resp.status_code} — skipping sleep data")
-                    self._sleep_error_logged = True
-            except Exception as e:
+            if isinstance(results[2], Exception):
                 if not self._sleep_error_logged:
-                    print(f"[bio] Sleep API failed: {e} — skipping sleep data")
+                    print(f"[bio] Sleep API failed: {results[2]} — skipping sleep data")
                     self._sleep_error_logged = True
+            elif results[2][0] == 200:
+                sleep_data = results[2][1]
+                self._sleep_error_logged = False
+            elif results[2][0] != 429 and not self._sleep_error_logged:
+                print(f"[bio] Sleep API returned HTTP {results[2][0]} — skipping sleep data")
+                self._sleep_error_logged = True
 
             recovery_records = recovery_data.get("records", [])
             recovery_scored = (len(recovery_records) > 0 and recovery_records[0].get("score_state") == "SCORED")
@@ -171,9 +324,8 @@ class BiometricEngine:
                 "spo2": recovery_score.get("spo2_percentage", 97.0),
                 "skinTemp": recovery_score.get("skin_temp_celsius", 33.5),
             }
-            hrv_value = self.current_data.get("hrv")
-            if hrv_value:
-                self.update_baseline(hrv_value)
+            await self.sync_history()
+            self._refresh_baseline(self.current_data.get("hrv"))
 
             src = "whoop+sleep" if sleep_scored else "whoop"
             print(f"[bio] source={src} | rec={self.current_data['recovery']} strain={self.current_data['strain']} hr={self.current_data['heartRate']} hrv={self.current_data['hrv']}")
@@ -203,7 +355,12 @@ class BiometricEngine:
         else:
             estimated_stress = 0.5
 
-        live_hr = self.live_heart_rate if (time.time() - self.live_hr_timestamp < 5) else 0
+        live_hr = self.hr_series.smoothed_hr()
+        # smoothing keeps one noisy reading from flipping between the lower states,
+        # but a raw sample past the STRESSED line still trips it within one reading
+        raw_hr = self.hr_series.latest_hr()
+        if raw_hr > 110:
+            live_hr = raw_hr
         if live_hr > 0:
             if live_hr > 110:
                 new_state = "STRESSED"
@@ -0,0 +1,53 @@
+import io
+
+import imagehash
+import numpy as np
+from PIL import Image
+from multiprocessing import shared_memory
+
+from config import JPEG_QUALITY, HASH_THRESHOLD
+
+# Everything the capture process pool runs lives here, so a worker unpickling
+# its task pulls in numpy/PIL/imagehash only, not mss or a display connection.
+
+
+def encode_jpeg(img, quality = JPEG_QUALITY):
+    buffer = io.BytesIO()
+    img.save(buffer, format = "JPEG", quality = quality)
+    return buffer.getvalue()
+
+
+def process_frame(src, size, out, last_hash = None, force = False):
+    # the BGRA buffer read as RGBX is a zero-copy view; resampling doesn't care
+    # which channel is which, so swap B and R only on the small result
+    image = Image.frombuffer("RGBX", size, src, "raw", "RGBX", 0, 1)
+    small = np.asarray(image.resize((out.shape[1], out.shape[0]), Image.Resampling.LANCZOS))
+    out[...] = small[:, :, 2::-1]
+
+    img = Image.fromarray(out)
+    current = imagehash.phash(img)
+    changed = last_hash is None or current - imagehash.hex_to_hash(last_hash) > HASH_THRESHOLD
+    jpeg = encode_jpeg(img) if changed or force else None
+    return str(current), changed, jpeg
+
+
+_segments = {}
+
+def _attach(role, name):
+    shm = _segments.get(role)
+    if shm is None or shm.name != name:
+        if shm is not None:
+            shm.close()
+        shm = shared_memory.SharedMemory(name = name)
+        _segments[role] = shm
+    return shm
+
+
+def process_shared(src_name, size, out_name, out_shape, last_hash, force):
+    width, height = size
+    src = _attach("src", src_name).buf[:width * height * 4]
+    out = np.ndarray(out_shape, dtype = np.uint8, buffer = _attach("out", out_name).buf)
+    try:
+        return process_frame(src, size, out, last_hash, force)
+    finally:
+        src.release()
@@ -9,15 +9,40 @@ WHOOP_CLIENT_SECRET = os.getenv("WHOOP_CLIENT_SECRET", "")
 
 CAPTURE_INTERVAL_DEFAULT = 3
 CAPTURE_WIDTH = 1280
+CAPTURE_WORKERS = 1
 JPEG_QUALITY = 60
 HASH_THRESHOLD = 5
+CHANGE_TILE = 32
+CHANGE_SAMPLE_STRIDE = 2
+CHANGE_DELTA = 1.0
+CHANGE_REGION_PAD = 1
+CHANGE_MAX_REGIONS = 6
+CHANGE_FULL_FRAME_RATIO = 0.35
+CONTEXT_WIDTH = 480
+CONTEXT_JPEG_QUALITY = 50
 
 INTERVENTION_COOLDOWN = 30
 VISION_MODEL = "claude-sonnet-4-20250514"
 VISION_MAX_TOKENS = 500
 GHOST_MAX_TOKENS_DEFAULT = 100
+STREAM_INTERVENTIONS = True
+FUSED_ANALYSIS = os.getenv("FUSED_ANALYSIS", "0").lower() in ("1", "true", "yes")
+VISION_IDLE_INTERVAL = 15
+
+LLM_BASE_URL = os.getenv("ANTHROPIC_BASE_URL", "")
+LLM_TIMEOUT = 20.0
+LLM_MAX_RETRIES = 1
+LLM_MAX_CONCURRENCY = 32
+LLM_PER_SESSION_CONCURRENCY = 2
+LLM_MAX_CONNECTIONS = 64
+LLM_KEEPALIVE_EXPIRY = 30.0
 
 HRV_BASELINE_WINDOW = 14
+HR_BUFFER_SIZE = 1024
+HR_WINDOW = 30
+RR_WINDOW = 60
+HR_EWMA_ALPHA = 0.3
+LIVE_HR_MAX_AGE = 5
 STRESS_HIGH_THRESHOLD = 2.0
 STRESS_MEDIUM_THRESHOLD = 1.0
 STRESS_FIREWALL_THRESHOLD = 2.0
@@ -26,9 +51,31 @@ WHOOP_TOKEN_REFRESH_BUFFER = 60
 WHOOP_API_VERSION = "v2"
 WHOOP_RATE_LIMIT_PER_MIN = 100
 WHOOP_RATE_LIMIT_PER_DAY = 10000
+WHOOP_RATE_HEADROOM = 0.8
+WHOOP_DAILY_BURST = 400
+WHOOP_TIMEOUT = 10.0
+WHOOP_MAX_CONNECTIONS = 10
+WHOOP_ENDPOINT_TTL = {
+    "recovery": 900,
+    "cycle": 120,
+    "activity/sleep": 900
+}
+WHOOP_HISTORY_DAYS = 30
+WHOOP_HISTORY_SYNC_INTERVAL = 3600
+WHOOP_HISTORY_RETRY_INTERVAL = 120
+WHOOP_PAGE_SIZE = 25
+WHOOP_POLL_INTERVAL = 60
+BIO_TICK_INTERVAL = 5
+BIO_RECLASSIFY_MIN_INTERVAL = 0.5
+BIO_PUSH_KEEPALIVE = 30
 
 HOST = "0.0.0.0"
-PORT = 8000
+PORT = int(os.getenv("PORT", "8000"))
+
+DEFAULT_USER_ID = "default"
+SESSION_IDLE_TIMEOUT = 300
+CLIENT_QUEUE_SIZE = 256
+CLIENT_SEND_TIMEOUT = 5.0
 
 USE_MOCK_BIOMETRICS = True
 
@@ -36,3 +83,26 @@ GAME_MODE = True
 GAME_APPS = ["code", "terminal", "browser", "notes", "chat"]
 CONTENT_REANALYZE_INTERVAL = 15
 CONTENT_MIN_LENGTH = 10
+PROMPT_TOKEN_BUDGET = 2000
+PROMPT_WINDOW_LINES = 120
+PROMPT_DIFF_SHARE = 0.35
+ANALYSIS_CACHE_SIZE = 2048
+ANALYSIS_CACHE_TTL = 3600
+ANALYSIS_CACHE_PATH = os.getenv(
+    "ANALYSIS_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".analysis_cache.db")
+)
+ACTIVITY_DB_PATH = os.getenv(
+    "ACTIVITY_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".activity.db")
+)
+ACTIVITY_RAW_RETENTION = 2 * 86400
+ACTIVITY_MINUTE_RETENTION = 7 * 86400
+ACTIVITY_HOUR_RETENTION = 90 * 86400
+ACTIVITY_FLUSH_INTERVAL = 2.0
+INTERVENTION_LOG_PATH = os.getenv(
+    "INTERVENTION_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".interventions.db")
+)
+INTERVENTION_LOG_RETENTION = 180 * 86400
+ANALYSIS_WORKERS = 8
@@ -1,9 +1,13 @@
 
+import asyncio
 import json
 import re
 import time
-from anthropic import Anthropic
-from config import CLAUDE_API_KEY, VISION_MODEL, VISION_MAX_TOKENS
+from config import CLAUDE_API_KEY, VISION_MODEL, VISION_MAX_TOKENS, GHOST_MAX_TOKENS_DEFAULT
+from llm_client import get_llm_client
+from ghost_brain import GhostBrain
+from analysis_cache import get_analysis_cache, analysis_key, content_digest
+from prompt_builder import PromptBuilder
 
 RISKY_COMMAND_PATTERNS = [
     (r'rm\s+(-[a-zA-Z]*f[a-zA-Z]*\s+|.*-rf\s+)', 'Destructive file deletion (rm -rf)'),
@@ -24,6 +28,32 @@ RISKY_COMMAND_PATTERNS = [
     (r'docker\s+system\s+prune\s+-a', 'Docker full prune — removes all unused data'),
 ]
 
+FUSED_PROMPT = """
+
+The user's biometric state is {state} (estimated stress {stress:.1f}/3.0, HRV baseline {hrv:.0f}ms).
+Ghost's personality right now: {personality}
+Tone: {tone}. Verbosity: {verbosity}.
+
+Add one more field to the JSON object:
+    "ghost_message": "exactly what Ghost should say to the user now, in that personality (plain text, no markdown)"
+"""
+
+# Patterns are compiled once, lowercased, without IGNORECASE: re can then jump
+# straight to each leading literal instead of trying every pattern at every
+# offset. A cheap substring check on that literal skips absent patterns.
+RISKY_COMMAND_MATCHERS = [
+    (re.match(r"[a-z:]+", pattern.lower()).group(), re.compile(pattern.lower(), re.MULTILINE), description)
+    for pattern, description in RISKY_COMMAND_PATTERNS
+]
+SCAN_ANCHOR_CHARS = 256
+
+def match_risky_command(text):
+    lowered = text.lower()
+    for trigger, regex, description in RISKY_COMMAND_MATCHERS:
+        if trigger in lowered and regex.search(lowered):
+            return True, description
+    return False, None
+
 class ContentAnalyzer:
     APP_PROMPTS = {
         "code": """You are Ghost, an AI assistant analyzing code in real-time. Analyze this
@@ -178,22 +208,55 @@ Signs of communication issues:
 - Responding while clearly frustrated"""
     }
 
-    def __init__(self, api_key):
-        self.client = Anthropic(api_key = api_key)
+    def __init__(self, api_key, session_id = None):
+        self.client = get_llm_client(api_key)
+        self.session_id = session_id
+        self.cache = get_analysis_cache()
+        self.prompt_builder = PromptBuilder()
         self.last_analysis = None
         self.last_analysis_time = 0
         self.content_history = {}
+        self.terminal_scan_offset = 0
+        self.terminal_scan_anchor = ""
 
     def detect_risky_commands(self, content):
-        for pattern, description in RISKY_COMMAND_PATTERNS:
-            if re.search(pattern, content, re.IGNORECASE | re.MULTILINE):
-                return True, description
-        return False, None
+        return match_risky_command(content)
 
-    def analyze(self, app_type, content, extra_context = "", **kwargs):
+    def scan_new_terminal_output(self, content):
+        start = 0
+        anchor = self.terminal_scan_anchor
+        if anchor:
+            offset = self.terminal_scan_offset
+            if content[offset - len(anchor):offset] == anchor:
+                start = offset
+            else:
+                # scrollback trimmed from the front or rewritten: find where we left off
+                idx = content.rfind(anchor)
+                if idx >= 0:
+                    start = idx + len(anchor)
+
+        # only consume complete lines so a command still being typed is rescanned
+        end = content.rfind("\n", start) + 1
+        result = match_risky_command(content[start:])
+        if end > 0:
+            self.terminal_scan_offset = end
+            self.terminal_scan_anchor = content[max(0, end - SCAN_ANCHOR_CHARS):end]
+        return result
+
+    def _fused_prompt(self, biometric_state, modifiers):
+        return FUSED_PROMPT.format(
+            state = biometric_state,
+            stress = modifiers.get("estimated_stress", 0),
+            hrv = modifiers.get("hrv_baseline", 50),
+            personality = GhostBrain.PROMPTS.get(biometric_state, GhostBrain.PROMPTS["RELAXED"]),
+            tone = modifiers.get("tone", "neutral"),
+            verbosity = modifiers.get("verbosity", "short")
+        )
+
+    async def analyze(self, app_type, content, extra_context = "", biometric_state = None, modifiers = None, **kwargs):
 
         if app_type == "terminal":
-            is_risky, risky_desc = self.detect_risky_commands(content)
+            is_risky, risky_desc = self.scan_new_terminal_output(content)
             if is_risky:
                 analysis = {
                     "app": "terminal",
@@ -219,8 +282,15 @@ Signs of communication issues:
                 return analysis
 
         system_prompt = self.APP_PROMPTS.get(app_type, self.APP_PROMPTS["code"])
+        max_tokens = VISION_MAX_TOKENS
+        fused_prompt = None
+        if biometric_state:
+            modifiers = modifiers or {}
+            fused_prompt = self._fused_prompt(biometric_state, modifiers)
+            system_prompt += fused_prompt
+            max_tokens += modifiers.get("max_tokens", GHOST_MAX_TOKENS_DEFAULT)
         user_msg = f"App type: {app_type}\n"
-        user_msg += f"Content:\n{content}\n"
+        user_msg += f"Content:\n{self.prompt_builder.build(app_type, content, kwargs.get('cursor_line'))}\n"
 
         if kwargs.get("language"):
             user_msg += f"\nLanguage: {kwargs['language']}"
@@ -235,7 +305,7 @@ Signs of communication issues:
         if extra_context:
             user_msg += f"\n\nRecent context: {extra_context}"
 
-        content_hash = hash(content[:500])
+        content_hash = content_digest(content)
         now = time.time()
 
         if app_type not in self.content_history:
@@ -250,10 +320,25 @@ Signs of communication issues:
         if recent_same >= 3:
             user_msg += f"\n\nNOTE: The content has not changed for {recent_same} consecutive checks (~{recent_same * 5}+ seconds). The user may be stuck."
 
+        # the cache is shared across users: anything per-user that shapes the answer goes in the key.
+        # fused answers carry a ghost_message written for this user's stress and HRV, so they stay per session
+        extra = ["stuck" if recent_same >= 3 else "", extra_context or ""]
+        if fused_prompt:
+            extra += [self.session_id or "", fused_prompt]
+        cache_key = analysis_key(app_type, content, kwargs, biometric_state, "\0".join(extra))
+        # a miss falls through to SQLite; keep that off the event loop
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
+        if cached is not None:
+            self.prompt_builder.commit(app_type, content)
+            self.last_analysis = cached
+            self.last_analysis_time = now
+            return cached
+
         try:
-            response = self.client.messages.create(
+            response = await self.client.create(
+                session_id = self.session_id,
                 model = VISION_MODEL,
-                max_tokens = VISION_MAX_TOKENS,
+                max_tokens = max_tokens,
                 system = system_prompt,
                 messages = [{"role": "user", "content": user_msg}]
             )
@@ -265,6 +350,8 @@ Signs of communication issues:
                     text = text[:-3]
 
             analysis = json.loads(text)
+            await asyncio.to_thread(self.cache.put, cache_key, analysis)
+            self.prompt_builder.commit(app_type, content)
 
             self.last_analysis = analysis
             self.last_analysis_time = now
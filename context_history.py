@@ -1,17 +1,31 @@
 
 import time
+from collections import deque
+from itertools import islice
 
 class ContextTracker:
-    def __init__(self):
-        self.history = []
-        self.max_history = 100
+    def __init__(self, max_history = 100, max_stress_history = 500, store = None, user_id = None):
+        self.store = store
+        self.user_id = user_id
+        self.max_history = max_history
+        self.history = deque(maxlen = max_history)
         self.current_app = None
         self.current_activity = None
         self.app_start_time = None
         self.stuck_start_time = None
         self.stuck_duration = 0
         self.context_switches = 0
-        self.stress_history = []
+
+        self.stuck_count = 0
+        self.state_counts = {}
+
+        self.max_stress_history = max_stress_history
+        self.stress_history = deque(maxlen = max_stress_history)
+        self.stress_sum = 0.0
+        self.stress_high_count = 0
+        self.stress_total = 0
+        # (sequence number, score), scores strictly decreasing; head is the window peak
+        self.stress_peaks = deque()
 
     def update(self, vision_analysis, biometric_state, estimated_stress = 0):
         now = time.time()
@@ -24,14 +38,17 @@ class ContextTracker:
             "estimated_stress": estimated_stress
         }
 
+        if len(self.history) == self.max_history:
+            self._forget(self.history[0])
         self.history.append(entry)
+        if entry["stuck"]:
+            self.stuck_count += 1
+        state = entry["state"] or "UNKNOWN"
+        self.state_counts[state] = self.state_counts.get(state, 0) + 1
 
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
-
-        self.stress_history.append((now, estimated_stress))
-        if len(self.stress_history) > 500:
-            self.stress_history.pop(0)
+        self._add_stress(now, estimated_stress)
+        if self.store is not None:
+            self.store.record(self.user_id, now, entry["app"], entry["activity"], state, entry["stuck"], estimated_stress)
 
         new_app = vision_analysis.get("app")
 
@@ -52,10 +69,41 @@ class ContextTracker:
             self.stuck_start_time = None
             self.stuck_duration = 0
 
+    def _forget(self, entry):
+        if entry["stuck"]:
+            self.stuck_count -= 1
+        state = entry["state"] or "UNKNOWN"
+        self.state_counts[state] -= 1
+        if self.state_counts[state] == 0:
+            del self.state_counts[state]
+
+    def _add_stress(self, now, score):
+        if len(self.stress_history) == self.max_stress_history:
+            _, old = self.stress_history[0]
+            self.stress_sum -= old
+            if old > 2.0:
+                self.stress_high_count -= 1
+        self.stress_history.append((now, score))
+        self.stress_sum += score
+        if score > 2.0:
+            self.stress_high_count += 1
+
+        seq = self.stress_total
+        self.stress_total += 1
+        while self.stress_peaks and self.stress_peaks[-1][1] <= score:
+            self.stress_peaks.pop()
+        self.stress_peaks.append((seq, score))
+        if self.stress_peaks[0][0] <= seq - self.max_stress_history:
+            self.stress_peaks.popleft()
+
+        # re-anchor the running sum once per window so float error can't build up
+        if self.stress_total % self.max_stress_history == 0:
+            self.stress_sum = sum(s for _, s in self.stress_history)
+
     def get_summary(self):
         if not self.history:
             return "No activity yet."
-        recent = self.history[-10:]
+        recent = list(islice(reversed(self.history), 10))
         apps_used = list(set(h["app"] for h in recent if h["app"]))
         activities = list (set(h["activity"] for h in recent if h["activity"]))
         summary = f"Apps: {', '.join(apps_used)}. "
@@ -69,8 +117,7 @@ class ContextTracker:
     def get_rapid_switching(self):
         if len(self.history) < 6:
             return False
-        recent = self.history[-6:]
-        apps = [h["app"] for h in recent]
+        apps = [h["app"] for h in islice(reversed(self.history), 6)]
         unique_apps = len(set(apps))
         return unique_apps >= 4
 
@@ -78,14 +125,12 @@ class ContextTracker:
         if not self.stress_history:
             return {"avg": 0, "peak": 0, "current": 0, "high_stress_minutes": 0}
 
-        scores = [s for _, s in self.stress_history]
-        current = scores[-1] if scores else 0
-        avg = sum(scores) / len(scores)
-        peak = max(scores)
+        current = self.stress_history[-1][1]
+        avg = self.stress_sum / len(self.stress_history)
+        peak = self.stress_peaks[0][1]
 
-        high_count = sum(1 for s in scores if s > 2.0)
         avg_interval = 5
-        high_stress_minutes = round((high_count * avg_interval) / 60, 1)
+        high_stress_minutes = round((self.stress_high_count * avg_interval) / 60, 1)
 
         return {
             "avg": round (avg, 2),
@@ -99,18 +144,13 @@ class ContextTracker:
             return{}
 
         total_time = self.history[-1]["timestamp"] - self.history[0]["timestamp"]
-        stuck_entries = [h for h in self.history if h.get("stuck")]
-        state_counts = {}
-        for h in self.history:
-            s = h.get("state", "UNKNOWN")
-            state_counts[s] = state_counts.get(s, 0) + 1
 
         stats = {
             "session_duration_minutes": round(total_time / 60, 1),
                 "total_analyses": len(self.history),
-                "times_stuck": len(stuck_entries),
+                "times_stuck": self.stuck_count,
                 "context_switches": self.context_switches,
-                "state_distribution": state_counts,
+                "state_distribution": dict(self.state_counts),
                 "current_app": self.current_app,
                 "current_activity": self.current_activity,
                 "stress_stats": self.get_stress_stats()
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from collections import deque
+
+from config import CLIENT_QUEUE_SIZE, CLIENT_SEND_TIMEOUT
+
+PRIORITY_TYPES = {
+    "intervention", "intervention_start", "intervention_delta", "intervention_end",
+    "state_change", "sleep_mode"
+}
+# only the newest frame of these matters, older queued ones are replaced
+COALESCED_TYPES = {"biometric_update", "status_snapshot"}
+
+
+def encode(message):
+    return json.dumps(message, separators = (",", ":"), ensure_ascii = False)
+
+
+class ClientChannel:
+    def __init__(self, ws, on_close = None, max_queue = CLIENT_QUEUE_SIZE, send_timeout = CLIENT_SEND_TIMEOUT):
+        self.ws = ws
+        self.on_close = on_close
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.priority = deque()
+        self.normal = deque()
+        self.coalesced = {}
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.coalesced_count = 0
+        self.task = None
+        self.wants_status = False
+
+    def start(self):
+        self.task = asyncio.create_task(self._writer())
+        return self
+
+    def pending(self):
+        return len(self.priority) + len(self.normal) + len(self.coalesced)
+
+    def push(self, msg_type, text):
+        if self.closed:
+            return False
+        if msg_type in COALESCED_TYPES:
+            if msg_type in self.coalesced:
+                self.coalesced_count += 1
+            self.coalesced[msg_type] = text
+        elif msg_type in PRIORITY_TYPES:
+            self.priority.append(text)
+        else:
+            self.normal.append(text)
+
+        if self.pending() > self.max_queue:
+            print(f"[fanout] Client fell {self.pending()} frames behind — disconnecting")
+            self.close()
+            return False
+        self.wakeup.set()
+        return True
+
+    def send(self, message):
+        return self.push(message.get("type"), encode(message))
+
+    def _next(self):
+        if self.priority:
+            return self.priority.popleft()
+        if self.normal:
+            return self.normal.popleft()
+        if self.coalesced:
+            key = next(iter(self.coalesced))
+            return self.coalesced.pop(key)
+        return None
+
+    async def _writer(self):
+        try:
+            while not self.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                text = self._next()
+                while text is not None and not self.closed:
+                    await asyncio.wait_for(self.ws.send_text(text), self.send_timeout)
+                    self.sent += 1
+                    text = self._next()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if not self.closed:
+                print(f"[fanout] Client send failed: {type(e).__name__} — disconnecting")
+                self.close()
+
+    def close(self, close_socket = True):
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+        if close_socket:
+            asyncio.ensure_future(self._close_socket())
+        if self.on_close:
+            self.on_close(self)
+
+    async def _close_socket(self):
+        try:
+            await self.ws.close(code = 1013)
+        except Exception:
+            pass
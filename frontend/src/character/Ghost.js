@@ -471,17 +471,33 @@ export class Ghost {
 
     _typewriterEffect(el, text) {
         el.textContent = '';
+        this._typewriterText = text;
         let i = 0;
         const interval = setInterval(() => {
-            el.textContent += text[i];
-            i++;
-            if (i >= text.length) clearInterval(interval);
+            if (i < this._typewriterText.length) {
+                el.textContent += this._typewriterText[i];
+                i++;
+            } else if (!this._currentData?.streaming) {
+                clearInterval(interval);
+            }
         }, 18);
         this._typewriterInterval = interval;
     }
 
+    appendSpeech(id, delta) {
+        if (!this._bubble || this._currentData?.id !== id) return;
+        this._currentData.message += delta;
+        this._typewriterText += delta;
+    }
+
+    endSpeech(data) {
+        if (!this._bubble || this._currentData?.id !== data.id) return;
+        Object.assign(this._currentData, data, { streaming: false });
+        this._typewriterText = data.message || this._typewriterText;
+    }
+
     _onButtonClick(label) {
-        if (this._onFeedback) this._onFeedback(label);
+        if (this._onFeedback) this._onFeedback(label, this._currentData?.id);
 
         if (label === 'Apply Fix' && this._onApplyFix && this._currentData?.code_suggestion) {
             this._onApplyFix(this._currentData.code_suggestion);
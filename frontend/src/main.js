@@ -109,15 +109,41 @@ const whoopBLE = new WHOOPBluetooth();
 
 let bleWasConnected = false;
 
-whoopBLE.onUpdate((bpm, connected) => {
+// heart-rate samples go out in one live_hr_batch frame per interval
+const HR_BATCH_INTERVAL_MS = 1000;
+const HR_BATCH_MAX = 16;
+let hrBatch = { t: [], hr: [], rr: [] };
+let hrFlushTimer = null;
+
+function flushHRBatch() {
+    clearTimeout(hrFlushTimer);
+    hrFlushTimer = null;
+    if (hrBatch.hr.length === 0) return;
+    socket.send({ type: 'live_hr_batch', ...hrBatch });
+    hrBatch = { t: [], hr: [], rr: [] };
+}
+
+function queueHRSample(bpm, rr) {
+    hrBatch.t.push(Date.now());
+    hrBatch.hr.push(bpm);
+    hrBatch.rr.push(rr);
+    if (hrBatch.hr.length >= HR_BATCH_MAX) {
+        flushHRBatch();
+    } else if (!hrFlushTimer) {
+        hrFlushTimer = setTimeout(flushHRBatch, HR_BATCH_INTERVAL_MS);
+    }
+}
+
+whoopBLE.onUpdate((bpm, connected, rr) => {
     if (connected && bpm > 0) {
-        socket.send({ type: 'live_hr', heart_rate: bpm });
+        queueHRSample(bpm, rr || []);
         if (!bleWasConnected) {
             socket.send({ type: 'ble_reconnected' });
             bleWasConnected = true;
         }
     }
     if (!connected && bleWasConnected) {
+        flushHRBatch();
         socket.send({ type: 'ble_disconnected' });
         bleWasConnected = false;
     }
@@ -264,12 +290,12 @@ furniture.on('interact', (name) => {
     openApp(name);
 });
 
-ghost.setFeedbackHandler((label) => {
+ghost.setFeedbackHandler((label, interventionId) => {
     if (label.startsWith('Reset counter')) {
         coffeeCount = 0;
         return;
     }
-    socket.sendFeedback(label);
+    socket.sendFeedback(label, interventionId);
     if (label === 'Apply Fix' || label === 'I Understand') {
         furniture.onInterventionAccepted();
     }
@@ -286,6 +312,9 @@ socket.on('connected',    ()     => { hud.setConnected(true);  dashboardOverlay.
 socket.on('disconnected', ()     => { hud.setConnected(false); dashboardOverlay.setConnected(false); });
 
 socket.on('intervention', (data) => { ghost.showSpeechBubble(data); dashboardOverlay.addIntervention(data); });
+socket.on('intervention_start', (data) => { ghost.showSpeechBubble({ ...data, message: '', streaming: true }); });
+socket.on('intervention_delta', (data) => { ghost.appendSpeech(data.id, data.delta); });
+socket.on('intervention_end',   (data) => { ghost.endSpeech(data); dashboardOverlay.addIntervention(data); });
 
 socket.on('biometric_update', (data) => {
     if (data.heartRate) currentHR = data.heartRate;
@@ -50,12 +50,24 @@ export class WHOOPBluetooth {
     _onHeartRate(event) {
         const value = event.target.value;
         const flags = value.getUint8(0);
+        let offset = 1;
         if (flags & 0x01) {
-            this.currentBPM = value.getUint16(1, true);
+            this.currentBPM = value.getUint16(offset, true);
+            offset += 2;
         } else {
-            this.currentBPM = value.getUint8(1);
+            this.currentBPM = value.getUint8(offset);
+            offset += 1;
         }
-        this._notifyListeners(this.currentBPM, true);
+        if (flags & 0x08) offset += 2; // energy expended
+
+        // RR intervals arrive in 1/1024 s units
+        const rr = [];
+        if (flags & 0x10) {
+            for (; offset + 1 < value.byteLength; offset += 2) {
+                rr.push(Math.round(value.getUint16(offset, true) * 1000 / 1024));
+            }
+        }
+        this._notifyListeners(this.currentBPM, true, rr);
     }
 
     async _tryReconnect() {
@@ -87,8 +99,8 @@ export class WHOOPBluetooth {
         this._listeners.push(callback);
     }
 
-    _notifyListeners(bpm, connected) {
-        this._listeners.forEach(cb => cb(bpm, connected));
+    _notifyListeners(bpm, connected, rr = []) {
+        this._listeners.forEach(cb => cb(bpm, connected, rr));
     }
 
     disconnect() {
@@ -1,7 +1,8 @@
 
 export class GhostSocket {
     constructor(url = 'ws://localhost:8000/ws') {
-        this.url = url;
+        const user = new URLSearchParams(window.location.search).get('user');
+        this.url = user ? `${url}?user=${encodeURIComponent(user)}` : url;
         this.ws = null;
         this.listeners = new Map();
         this.contentTimer = null;
@@ -42,6 +43,15 @@ export class GhostSocket {
             case 'intervention':
                 this.emit('intervention', msg);
                 break;
+            case 'intervention_start':
+                this.emit('intervention_start', msg);
+                break;
+            case 'intervention_delta':
+                this.emit('intervention_delta', msg);
+                break;
+            case 'intervention_end':
+                this.emit('intervention_end', msg);
+                break;
             case 'biometric_update':
                 this.emit('biometric_update', msg);
                 break;
@@ -101,10 +111,11 @@ export class GhostSocket {
         }, 1500);
     }
 
-    sendFeedback(action) {
+    sendFeedback(action, interventionId = null) {
         this.send({
             type: 'feedback',
             action: action,
+            intervention_id: interventionId,
             timestamp: new Date().toISOString()
         });
     }
@@ -1,11 +1,17 @@
 
 import time
-import anthropic
+import uuid
 
 from config import VISION_MODEL, GHOST_MAX_TOKENS_DEFAULT
+from llm_client import get_llm_client
+
+ACCEPT_ACTIONS = ("Thanks", "Apply Fix", "Save Draft", "Show More")
+IGNORE_ACTIONS = ("Not Now", "Do It Anyway")
+
 class GhostBrain:
-    def __init__(self, api_key):
-        self.client = anthropic.Anthropic(api_key = api_key)
+    def __init__(self, api_key, session_id = None):
+        self.client = get_llm_client(api_key)
+        self.session_id = session_id
         self.last_intervention_time = 0
         self.cooldown = 30
         self.context_history = []
@@ -93,7 +99,7 @@ class GhostBrain:
 
         return False, "no_intervention_needed"
 
-    def generate_response(self, vision_analysis, biometric_state, modifiers):
+    def _build_prompt(self, vision_analysis, biometric_state, modifiers):
         recent_context = ""
         if self.context_history:
             summaries = [h.get("context_summary", "") for h in self.context_history[-5:]]
@@ -121,8 +127,14 @@ HRV baseline: {modifiers.get('hrv_baseline', 50):.0f}ms
 
 Generate a Ghost intervention. Be concise. Match the personality for {biometric_state} state."""
 
+        return system, user_msg
+
+    async def generate_response(self, vision_analysis, biometric_state, modifiers):
+        system, user_msg = self._build_prompt(vision_analysis, biometric_state, modifiers)
+
         try:
-            response = self.client.messages.create(
+            response = await self.client.create(
+                session_id = self.session_id,
                 model = VISION_MODEL,
                 max_tokens = modifiers.get("max_tokens", GHOST_MAX_TOKENS_DEFAULT),
                 system = system,
@@ -134,6 +146,21 @@ Generate a Ghost intervention. Be concise. Match the personality for {biometric_
             print (f"[ghost_brain] Claude API error: {e}")
             return None
 
+    async def stream_response(self, vision_analysis, biometric_state, modifiers):
+        system, user_msg = self._build_prompt(vision_analysis, biometric_state, modifiers)
+
+        try:
+            async for text in self.client.stream(
+                session_id = self.session_id,
+                model = VISION_MODEL,
+                max_tokens = modifiers.get("max_tokens", GHOST_MAX_TOKENS_DEFAULT),
+                system = system,
+                messages = [{"role": "user", "content": user_msg}]
+            ):
+                yield text
+        except Exception as e:
+            print (f"[ghost_brain] Claude streaming error: {e}")
+
     def _instant_risky_response(self, reason, vision_analysis, biometric_state, modifiers):
         cmd = vision_analysis.get("risky_description", "unknown command")
         hrv = f"{modifiers.get('hrv_baseline', 50):.0f}"
@@ -147,29 +174,30 @@ Generate a Ghost intervention. Be concise. Match the personality for {biometric_
         else:
             return f"Risky command detected: '{cmd}'. Double-check before running this."
 
-    def process(self, vision_analysis, biometric_state, modifiers):
+    def _remember(self, vision_analysis):
         self.context_history.append(vision_analysis)
         if len(self.context_history) > self.max_history:
             self.context_history.pop(0)
 
-        should_speak, reason = self.should_intervene(vision_analysis, biometric_state, modifiers)
-        if not should_speak:
-            return None
+    def _is_instant(self, reason, vision_analysis):
+        return reason in ("fatigue_firewall", "stress_firewall", "risky_action_detected") and vision_analysis.get("risky_action")
 
-        if reason in ("fatigue_firewall", "stress_firewall", "risky_action_detected") and vision_analysis.get("risky_action"):
-            ghost_message = self._instant_risky_response(reason, vision_analysis, biometric_state, modifiers)
-        else:
-            ghost_message = self.generate_response(vision_analysis, biometric_state, modifiers)
-        if ghost_message is None:
-            intervention = vision_analysis.get("suggested_intervention")
-            if intervention:
-                ghost_message = intervention.get("message", "...")
-            else:
-                return None
+    def _prepared_message(self, reason, vision_analysis, biometric_state, modifiers):
+        if self._is_instant(reason, vision_analysis):
+            return self._instant_risky_response(reason, vision_analysis, biometric_state, modifiers)
+        return vision_analysis.get("ghost_message") or None
+
+    def _fallback_message(self, vision_analysis):
+        intervention = vision_analysis.get("suggested_intervention")
+        if intervention:
+            return intervention.get("message", "...")
+        return None
 
+    def _mark_spoken(self):
         self.last_intervention_time = time.time()
         self.intervention_count += 1
 
+    def _build_intervention(self, reason, vision_analysis, biometric_state, ghost_message):
         priority = "medium"
         if reason == "stress_firewall":
             priority = "critical"
@@ -195,7 +223,8 @@ Generate a Ghost intervention. Be concise. Match the personality for {biometric_
             "buttons": buttons,
             "context": vision_analysis.get("context_summary", ""),
             "code_suggestion": vision_analysis.get("suggested_intervention", {}).get("code_suggestion"),
-            "timestamp": time.time()
+            "timestamp": time.time(),
+            "id": uuid.uuid4().hex[:12]
         }
 
         if reason == "risky_action_detected":
@@ -205,10 +234,64 @@ Generate a Ghost intervention. Be concise. Match the personality for {biometric_
 
         return intervention
 
+    async def process(self, vision_analysis, biometric_state, modifiers):
+        self._remember(vision_analysis)
+
+        should_speak, reason = self.should_intervene(vision_analysis, biometric_state, modifiers)
+        if not should_speak:
+            return None
+
+        ghost_message = self._prepared_message(reason, vision_analysis, biometric_state, modifiers)
+        if ghost_message is None:
+            ghost_message = await self.generate_response(vision_analysis, biometric_state, modifiers)
+        if ghost_message is None:
+            ghost_message = self._fallback_message(vision_analysis)
+            if ghost_message is None:
+                return None
+
+        self._mark_spoken()
+        return self._build_intervention(reason, vision_analysis, biometric_state, ghost_message)
+
+    async def process_stream(self, vision_analysis, biometric_state, modifiers):
+        self._remember(vision_analysis)
+
+        should_speak, reason = self.should_intervene(vision_analysis, biometric_state, modifiers)
+        if not should_speak:
+            return
+
+        intervention = self._build_intervention(reason, vision_analysis, biometric_state, "")
+        intervention_id = intervention["id"]
+        start = {k: v for k, v in intervention.items() if k != "message"}
+        start["type"] = "intervention_start"
+        start["id"] = intervention_id
+
+        parts = []
+        prepared = self._prepared_message(reason, vision_analysis, biometric_state, modifiers)
+        if prepared is None:
+            async for text in self.stream_response(vision_analysis, biometric_state, modifiers):
+                if not parts:
+                    self._mark_spoken()
+                    yield start
+                parts.append(text)
+                yield {"type": "intervention_delta", "id": intervention_id, "delta": text}
+
+        if not parts:
+            ghost_message = prepared or self._fallback_message(vision_analysis)
+            if ghost_message is None:
+                return
+            self._mark_spoken()
+            yield start
+            parts.append(ghost_message)
+            yield {"type": "intervention_delta", "id": intervention_id, "delta": ghost_message}
+
+        intervention["message"] = "".join(parts)
+        intervention["type"] = "intervention_end"
+        yield intervention
+
     def user_feedback(self, action):
 
-        if action in ["Thanks", "Apply Fix", "Save Draft", "Show More"]:
+        if action in ACCEPT_ACTIONS:
             self.accepted_count += 1
             self.ignored_count = max(0, self.ignored_count -1)
-        elif action in ["Not Now", "Do It Anyway"]:
+        elif action in IGNORE_ACTIONS:
             self.ignored_count += 1
@@ -0,0 +1,167 @@
+import math
+import time
+
+import numpy as np
+
+from config import HR_BUFFER_SIZE, HR_WINDOW, HR_EWMA_ALPHA, RR_WINDOW, LIVE_HR_MAX_AGE
+
+
+class RingSeries:
+    def __init__(self, capacity, window, alpha = HR_EWMA_ALPHA, max_gap = None):
+        self.capacity = capacity
+        self.window = min(window, capacity)
+        self.alpha = alpha
+        # a silence longer than this restarts the EWMA instead of carrying stale history
+        self.max_gap = max_gap
+        self.ts = np.zeros(capacity)
+        self.values = np.zeros(capacity)
+        self.head = 0
+        self.count = 0
+        self.total = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.ewma = None
+
+    def append(self, t, value):
+        if self.max_gap is not None and self.count:
+            last_t = self.ts[(self.head - 1) % self.capacity]
+            if t - last_t > self.max_gap:
+                self.ewma = None
+        if self.count >= self.window:
+            # value about to fall out of the rolling window
+            old = float(self.values[(self.head - self.window) % self.capacity])
+            self.sum -= old
+            self.sumsq -= old * old
+        self.ts[self.head] = t
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.total += 1
+        self.sum += value
+        self.sumsq += value * value
+        self.ewma = value if self.ewma is None else self.ewma + self.alpha * (value - self.ewma)
+        # running sums drift with float error, re-anchor once per lap of the buffer
+        if self.total % self.capacity == 0:
+            self._resum()
+
+    def extend(self, ts, values):
+        n = len(values)
+        if n == 0:
+            return
+        if n > self.capacity:
+            ts, values = ts[-self.capacity:], values[-self.capacity:]
+            n = self.capacity
+        first = 0
+        if self.max_gap is not None:
+            gaps = np.nonzero(np.diff(ts) > self.max_gap)[0]
+            if gaps.size:
+                first = int(gaps[-1]) + 1
+                self.ewma = None
+            elif self.count and ts[0] - self.ts[(self.head - 1) % self.capacity] > self.max_gap:
+                self.ewma = None
+        idx = (self.head + np.arange(n)) % self.capacity
+        self.ts[idx] = ts
+        self.values[idx] = values
+        self.head = (self.head + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+        self.total += n
+
+        # only samples after the last gap feed the EWMA
+        values = values[first:]
+        m = n - first
+        start = values[0] if self.ewma is None else self.ewma
+        # closed-form EWMA over the batch: decayed start plus weighted samples
+        decay = (1 - self.alpha) ** np.arange(m - 1, -1, -1)
+        self.ewma = float(start * (1 - self.alpha) ** m + self.alpha * np.dot(decay, values))
+        self._resum()
+
+    def _resum(self):
+        recent = self.tail(self.window)
+        self.sum = float(recent.sum())
+        self.sumsq = float((recent * recent).sum())
+
+    def tail(self, n = None):
+        n = self.count if n is None else min(n, self.count)
+        idx = (self.head - n + np.arange(n)) % self.capacity
+        return self.values[idx]
+
+    def tail_ts(self, n = None):
+        n = self.count if n is None else min(n, self.count)
+        idx = (self.head - n + np.arange(n)) % self.capacity
+        return self.ts[idx]
+
+    def n_window(self):
+        return min(self.count, self.window)
+
+    def mean(self):
+        n = self.n_window()
+        return self.sum / n if n else 0.0
+
+    def std(self):
+        n = self.n_window()
+        if n < 2:
+            return 0.0
+        mean = self.sum / n
+        return math.sqrt(max(self.sumsq / n - mean * mean, 0.0))
+
+    def latest(self):
+        if not self.count:
+            return None, None
+        i = (self.head - 1) % self.capacity
+        return float(self.ts[i]), float(self.values[i])
+
+
+class HeartRateSeries:
+    def __init__(self, capacity = HR_BUFFER_SIZE):
+        self.hr = RingSeries(capacity, HR_WINDOW, max_gap = LIVE_HR_MAX_AGE)
+        self.rr = RingSeries(capacity, RR_WINDOW)
+        # squared successive RR differences, so RMSSD is a running mean
+        self.rr_diffsq = RingSeries(capacity, RR_WINDOW)
+
+    def append(self, hr, rr = None, t = None):
+        t = time.time() if t is None else t
+        self.hr.append(t, hr)
+        for interval in rr or ():
+            _, previous = self.rr.latest()
+            self.rr.append(t, interval)
+            if previous is not None:
+                diff = interval - previous
+                self.rr_diffsq.append(t, diff * diff)
+
+    def extend(self, ts, hr, rr_ts = None, rr = None):
+        self.hr.extend(ts, hr)
+        if rr is None or len(rr) == 0:
+            return
+        _, previous = self.rr.latest()
+        chain = rr if previous is None else np.concatenate(([previous], rr))
+        diffs = np.diff(chain)
+        self.rr.extend(rr_ts, rr)
+        self.rr_diffsq.extend(rr_ts[len(rr_ts) - len(diffs):], diffs * diffs)
+
+    def fresh(self, now = None, max_age = LIVE_HR_MAX_AGE):
+        last_t, _ = self.hr.latest()
+        now = time.time() if now is None else now
+        return last_t is not None and now - last_t < max_age
+
+    def smoothed_hr(self, now = None, max_age = LIVE_HR_MAX_AGE):
+        if not self.fresh(now, max_age):
+            return 0
+        return self.hr.ewma
+
+    def latest_hr(self, now = None, max_age = LIVE_HR_MAX_AGE):
+        if not self.fresh(now, max_age):
+            return 0
+        return self.hr.latest()[1]
+
+    def rmssd(self):
+        return math.sqrt(self.rr_diffsq.mean()) if self.rr_diffsq.n_window() else None
+
+    def summary(self):
+        rmssd = self.rmssd()
+        return {
+            "hr_mean": round(float(self.hr.mean()), 1),
+            "hr_std": round(self.hr.std(), 2),
+            "hr_ewma": round(float(self.hr.ewma), 1) if self.hr.ewma is not None else None,
+            "rmssd": round(rmssd, 1) if rmssd is not None else None,
+            "samples": self.hr.total
+        }
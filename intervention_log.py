@@ -0,0 +1,168 @@
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from config import INTERVENTION_LOG_PATH, INTERVENTION_LOG_RETENTION
+from ghost_brain import ACCEPT_ACTIONS, IGNORE_ACTIONS
+
+FILTER_COLUMNS = ("state", "app_type", "reason", "priority")
+MAX_PAGE = 200
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS interventions ("
+    "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL, user TEXT NOT NULL, ts REAL NOT NULL, "
+    "state TEXT, app_type TEXT, reason TEXT, priority TEXT, message TEXT, payload TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS interventions_user ON interventions (user, seq)",
+    "CREATE INDEX IF NOT EXISTS interventions_id ON interventions (id)",
+    "CREATE INDEX IF NOT EXISTS interventions_state ON interventions (user, state, seq)",
+    "CREATE INDEX IF NOT EXISTS interventions_app ON interventions (user, app_type, seq)",
+    "CREATE INDEX IF NOT EXISTS interventions_reason ON interventions (user, reason, seq)",
+    "CREATE INDEX IF NOT EXISTS interventions_priority ON interventions (user, priority, seq)",
+    "CREATE TABLE IF NOT EXISTS intervention_feedback ("
+    "intervention_id TEXT NOT NULL, ts REAL NOT NULL, action TEXT NOT NULL, outcome TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS intervention_feedback_id ON intervention_feedback (intervention_id, ts)",
+)
+
+
+def feedback_outcome(action):
+    if action in ACCEPT_ACTIONS:
+        return "accepted"
+    if action in IGNORE_ACTIONS:
+        return "ignored"
+    return "other"
+
+
+class InterventionLog:
+    def __init__(self, path = INTERVENTION_LOG_PATH):
+        self.lock = threading.Lock()
+        self.db = None
+        self.writes = 0
+        # a single thread keeps an intervention's append ahead of the feedback that follows it
+        self.executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "intervention_log")
+        if path:
+            self._open(path)
+
+    def run(self, loop, fn, *args, **kwargs):
+        return loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    def _open(self, path):
+        try:
+            self.db = sqlite3.connect(path, check_same_thread = False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                self.db.execute(statement)
+            self.db.commit()
+            self._prune(time.time())
+        except sqlite3.Error as e:
+            print(f"[intervention_log] Intervention log disabled: {e}")
+            self.db = None
+
+    def _prune(self, now):
+        cutoff = now - INTERVENTION_LOG_RETENTION
+        self.db.execute(
+            "DELETE FROM intervention_feedback WHERE intervention_id IN (SELECT id FROM interventions WHERE ts < ?)",
+            (cutoff,)
+        )
+        self.db.execute("DELETE FROM interventions WHERE ts < ?", (cutoff,))
+        self.db.commit()
+
+    def append(self, user_id, intervention, app_type = None):
+        if self.db is None:
+            return
+        payload = {k: v for k, v in intervention.items() if k not in ("biometric", "type")}
+        with self.lock:
+            try:
+                self.db.execute(
+                    "INSERT INTO interventions (id, user, ts, state, app_type, reason, priority, message, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        intervention.get("id") or "", user_id, intervention.get("timestamp") or time.time(),
+                        intervention.get("state"), app_type or intervention.get("app_type"),
+                        intervention.get("reason"), intervention.get("priority"),
+                        intervention.get("message"), json.dumps(payload)
+                    )
+                )
+                self.writes += 1
+                if self.writes % 1000 == 0:
+                    self._prune(time.time())
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"[intervention_log] Write failed: {e}")
+
+    def add_feedback(self, user_id, intervention_id, action, fallback_id = None):
+        # the latest intervention stands in only when the client sent no id, never for an unknown one
+        intervention_id = intervention_id or fallback_id
+        if self.db is None or not intervention_id:
+            return None
+        with self.lock:
+            try:
+                # ids come from the client; only attach feedback to this user's own interventions
+                inserted = self.db.execute(
+                    "INSERT INTO intervention_feedback (intervention_id, ts, action, outcome) "
+                    "SELECT id, ?, ?, ? FROM interventions WHERE id = ? AND user = ? LIMIT 1",
+                    (time.time(), action, feedback_outcome(action), intervention_id, user_id)
+                ).rowcount
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"[intervention_log] Feedback write failed: {e}")
+                return None
+        return intervention_id if inserted else None
+
+    def query(self, user_id, cursor = None, limit = 20, feedback = None, since = None, until = None, **filters):
+        if self.db is None:
+            return [], None
+        limit = max(1, min(int(limit), MAX_PAGE))
+        # latest feedback per intervention; the index on (intervention_id, ts) keeps this a lookup
+        query = (
+            "SELECT i.seq, i.payload, i.app_type, f.action, f.outcome, f.ts FROM interventions i "
+            "LEFT JOIN intervention_feedback f ON f.rowid = ("
+            "SELECT rowid FROM intervention_feedback WHERE intervention_id = i.id ORDER BY ts DESC LIMIT 1) "
+            "WHERE i.user = ?"
+        )
+        params = [user_id]
+        for column in FILTER_COLUMNS:
+            value = filters.get(column)
+            if value:
+                query += f" AND i.{column} = ?"
+                params.append(value)
+        if cursor:
+            query += " AND i.seq < ?"
+            params.append(int(cursor))
+        if since:
+            query += " AND i.ts >= ?"
+            params.append(since)
+        if until:
+            query += " AND i.ts < ?"
+            params.append(until)
+        if feedback == "none":
+            query += " AND f.outcome IS NULL"
+        elif feedback:
+            query += " AND f.outcome = ?"
+            params.append(feedback)
+        query += " ORDER BY i.seq DESC LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        results = []
+        for seq, payload, app_type, action, outcome, feedback_ts in rows:
+            entry = json.loads(payload)
+            entry["seq"] = seq
+            entry["app_type"] = app_type
+            entry["feedback"] = {"action": action, "outcome": outcome, "timestamp": feedback_ts} if action else None
+            results.append(entry)
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return results, next_cursor
+
+
+_log = None
+
+def get_intervention_log():
+    global _log
+    if _log is None:
+        _log = InterventionLog()
+    return _log
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import anthropic
+import httpx
+
+from config import (
+    LLM_BASE_URL, LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_MAX_CONCURRENCY,
+    LLM_PER_SESSION_CONCURRENCY, LLM_MAX_CONNECTIONS, LLM_KEEPALIVE_EXPIRY
+)
+
+class LLMClient:
+    def __init__(self, api_key, base_url = None, timeout = LLM_TIMEOUT,
+                 max_concurrency = LLM_MAX_CONCURRENCY,
+                 per_session_concurrency = LLM_PER_SESSION_CONCURRENCY):
+        self.timeout = timeout
+        self.per_session_concurrency = per_session_concurrency
+        self.http_client = anthropic.DefaultAsyncHttpxClient(
+            limits = httpx.Limits(
+                max_connections = LLM_MAX_CONNECTIONS,
+                max_keepalive_connections = LLM_MAX_CONNECTIONS,
+                keepalive_expiry = LLM_KEEPALIVE_EXPIRY
+            )
+        )
+        self.client = anthropic.AsyncAnthropic(
+            api_key = api_key,
+            base_url = base_url or None,
+            timeout = timeout,
+            max_retries = LLM_MAX_RETRIES,
+            http_client = self.http_client
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self._session_slots = {}
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def _session_slot(self, session_id):
+        if session_id is None:
+            yield
+            return
+        slot = self._session_slots.get(session_id)
+        if slot is None:
+            slot = [asyncio.Semaphore(self.per_session_concurrency), 0]
+            self._session_slots[session_id] = slot
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0 and self._session_slots.get(session_id) is slot:
+                del self._session_slots[session_id]
+
+    @asynccontextmanager
+    async def slot(self, session_id = None):
+        # session slot first, so one user's burst queues behind itself
+        # instead of holding global slots other users are waiting for
+        async with self._session_slot(session_id):
+            async with self.semaphore:
+                self.in_flight += 1
+                try:
+                    yield
+                finally:
+                    self.in_flight -= 1
+
+    async def create(self, session_id = None, timeout = None, **kwargs):
+        deadline = timeout or self.timeout
+        async with self.slot(session_id):
+            return await asyncio.wait_for(self.client.messages.create(**kwargs), deadline)
+
+    async def stream(self, session_id = None, timeout = None, **kwargs):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        async with self.slot(session_id):
+            async with self.client.messages.stream(**kwargs) as stream:
+                chunks = stream.text_stream.__aiter__()
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        text = await asyncio.wait_for(chunks.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        return
+                    if text:
+                        yield text
+
+    async def aclose(self):
+        await self.client.close()
+
+
+_clients = {}
+
+def get_llm_client(api_key, base_url = LLM_BASE_URL):
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        client = LLMClient(api_key, base_url = base_url)
+        _clients[key] = client
+    return client
+
+async def close_llm_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
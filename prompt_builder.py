@@ -0,0 +1,124 @@
+import difflib
+
+from config import PROMPT_TOKEN_BUDGET, PROMPT_WINDOW_LINES, PROMPT_DIFF_SHARE
+
+TAIL_APPS = ("terminal", "chat")
+NUMBERED_APPS = ("code",)
+MAX_LINE_CHARS = 400
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def _clip(line):
+    if len(line) > MAX_LINE_CHARS:
+        return line[:MAX_LINE_CHARS] + " …"
+    return line
+
+
+class PromptBuilder:
+    def __init__(self, token_budget = PROMPT_TOKEN_BUDGET, window_lines = PROMPT_WINDOW_LINES):
+        self.token_budget = token_budget
+        self.window_lines = window_lines
+        self.last_analyzed = {}
+
+    def commit(self, app_type, content):
+        self.last_analyzed[app_type] = content
+
+    def build(self, app_type, content, cursor_line = None):
+        if estimate_tokens(content) <= self.token_budget:
+            return content
+
+        lines = content.split("\n")
+        previous = self.last_analyzed.get(app_type)
+        diff_text = ""
+        first_change = None
+        # appended-only scrollback is fully covered by the tail window; other apps still need the
+        # diff so the window anchors on the appended lines instead of the top of the file
+        appended = app_type in TAIL_APPS and previous is not None and content.startswith(previous)
+        if previous is not None and previous != content and not appended:
+            diff_text, first_change = self._diff(previous.split("\n"), lines, int(self.token_budget * PROMPT_DIFF_SHARE))
+
+        anchor = None
+        try:
+            anchor = int(cursor_line) if cursor_line else None
+        except (TypeError, ValueError):
+            anchor = None
+        if anchor is None and app_type not in TAIL_APPS:
+            anchor = first_change
+
+        window_budget = self.token_budget - estimate_tokens(diff_text)
+        window_text = self._window(app_type, lines, anchor, window_budget)
+        if diff_text:
+            return f"{window_text}\n\n[Changes since last analysis]\n{diff_text}"
+        return window_text
+
+    def _window(self, app_type, lines, anchor, token_budget):
+        total = len(lines)
+        char_budget = max(token_budget, 0) * 4
+        numbered = app_type in NUMBERED_APPS
+
+        def render(n):
+            text = _clip(lines[n - 1])
+            return f"{n:>5}| {text}" if numbered else text
+
+        if anchor is None:
+            if app_type in TAIL_APPS:
+                lo = hi = total
+            else:
+                lo = hi = 1
+        else:
+            lo = hi = min(max(anchor, 1), total)
+
+        used = len(render(lo)) + 1
+        # grow around the anchor, alternating sides, until lines or budget run out
+        while hi - lo + 1 < self.window_lines:
+            grew = False
+            for side in ("up", "down"):
+                n = lo - 1 if side == "up" else hi + 1
+                if n < 1 or n > total:
+                    continue
+                cost = len(render(n)) + 1
+                if used + cost > char_budget:
+                    continue
+                used += cost
+                if side == "up":
+                    lo = n
+                else:
+                    hi = n
+                grew = True
+            if not grew:
+                break
+
+        body = "\n".join(render(n) for n in range(lo, hi + 1))
+        return f"[Showing lines {lo}-{hi} of {total}]\n{body}"
+
+    def _diff(self, old, new, token_budget):
+        start = 0
+        limit = min(len(old), len(new))
+        while start < limit and old[start] == new[start]:
+            start += 1
+        end = 0
+        while end < limit - start and old[-1 - end] == new[-1 - end]:
+            end += 1
+        old_mid = old[start:len(old) - end]
+        new_mid = new[start:len(new) - end]
+
+        char_budget = max(token_budget, 0) * 4
+        out = []
+        used = 0
+        matcher = difflib.SequenceMatcher(None, old_mid, new_mid, autojunk = True)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            hunk = [f"@@ line {start + j1 + 1}"]
+            hunk += [f"-{_clip(line)}" for line in old_mid[i1:i2]]
+            hunk += [f"+{_clip(line)}" for line in new_mid[j1:j2]]
+            for line in hunk:
+                if used + len(line) + 1 > char_budget:
+                    out.append("… (diff truncated)")
+                    return "\n".join(out), start + 1
+                out.append(line)
+                used += len(line) + 1
+        return "\n".join(out), start + 1
@@ -1,76 +1,321 @@
 
 import mss
+import numpy as np
 from PIL import Image 
-import imagehash 
 import base64
-import io
+import multiprocessing
 import threading
 import time
-from config import CAPTURE_WIDTH, JPEG_QUALITY, HASH_THRESHOLD
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from capture_worker import encode_jpeg, process_frame, process_shared
+from config import (
+    CAPTURE_WIDTH, JPEG_QUALITY,
+    CHANGE_TILE, CHANGE_SAMPLE_STRIDE, CHANGE_DELTA,
+    CHANGE_REGION_PAD, CHANGE_MAX_REGIONS, CHANGE_FULL_FRAME_RATIO,
+    CONTEXT_WIDTH, CONTEXT_JPEG_QUALITY, CAPTURE_WORKERS
+)
+
+
+def encode(img, quality = JPEG_QUALITY):
+    return base64.b64encode(encode_jpeg(img, quality)).decode()
+
+
+class Frame:
+    __slots__ = ("timestamp", "jpeg", "phash", "_b64")
+
+    def __init__(self, jpeg, timestamp = None, phash = None):
+        self.jpeg = jpeg
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.phash = phash
+        self._b64 = None
+
+    def b64(self):
+        # only frames that actually get sent pay for base64, and only once
+        if self._b64 is None:
+            self._b64 = base64.b64encode(self.jpeg).decode()
+        return self._b64
+
 
 class ScreenCapture:
-    def __init__(self):
+    def __init__(self, workers = CAPTURE_WORKERS):
         self.sct = mss.mss()
-        self.buffer = []
         self.buffer_size = 5
+        self.buffer = deque(maxlen = self.buffer_size)
         self.last_hash = None
         self.interval = 3
         self.running = False
-        self.latest_b64 = None
+        self.last_thumb = None
+        self.latest_frame = None
+        self.latest_timestamp = None
+        self.source_width = None
+        # bumped for every new frame; consumers only ever look at the newest one
+        self.frame_seq = 0
+        self.on_frame = None
+        self.workers = workers
+        self.pool = None
+        self.source_size = None
+        self.src_shm = None
+        self.src_view = None
+        # two output frames: the worker fills one while take_changes reads the other
+        self.out_shm = []
+        self.out_views = []
+        self.wake = threading.Event()
+        self.thread = None
+        # tiles that moved since the last take_changes(), OR-ed across ticks
+        self.dirty = None
+        self.dirty_lock = threading.Lock()
+        self.stats = {"grabbed": 0, "skipped_static": 0, "skipped_hash": 0, "encoded": 0}
 
-    def capture (self):
+    def grab(self):
         monitor = self.sct.monitors[1]
         screenshot = self.sct.grab(monitor)
+        return screenshot
+
+    def thumbnail(self, screenshot):
+        width, height = screenshot.size
+        # view straight over the BGRA bytes, no copy
+        frame = np.frombuffer(screenshot.raw, dtype = np.uint8).reshape(height, width, 4)
+        rows = height // CHANGE_TILE * CHANGE_TILE
+        cols = width // CHANGE_TILE * CHANGE_TILE
+        step = CHANGE_SAMPLE_STRIDE
+        # green channel as a luma stand-in, sampled every `step` px, averaged per tile
+        green = frame[:rows:step, :cols:step, 1]
+        per_tile = CHANGE_TILE // step
+        return green.reshape(rows // CHANGE_TILE, per_tile, cols // CHANGE_TILE, per_tile).mean(axis = (1, 3), dtype = np.float32)
 
-        img = Image.frombytes("RGB", screenshot.size, screenshot.bgra, "raw", "BGRX")
+    def frame_changed(self, thumb):
+        last = self.last_thumb
+        if last is None or last.shape != thumb.shape:
+            return True
+        return float(np.abs(thumb - last).max()) > CHANGE_DELTA
 
-        ratio = CAPTURE_WIDTH / img.width 
-        new_size = (CAPTURE_WIDTH, int (img.height * ratio))
-        img = img.resize(new_size, Image.Resampling.LANCZOS)
+    def dirty_tiles(self, thumb):
+        last = self.last_thumb
+        if last is None or last.shape != thumb.shape:
+            return np.ones(thumb.shape, dtype = bool)
+        return np.abs(thumb - last) > CHANGE_DELTA
 
-        buffer = io.BytesIO()
-        img.save(buffer, format = "JPEG", quality = JPEG_QUALITY)
-        b64 = base64.b64encode(buffer.getvalue()).decode()
-        return img, b64
+    def mark_dirty(self, tiles, frame, source_width, timestamp):
+        with self.dirty_lock:
+            if self.dirty is None or self.dirty.shape != tiles.shape:
+                self.dirty = tiles.copy()
+            else:
+                self.dirty |= tiles
+            self.latest_frame = frame
+            self.latest_timestamp = timestamp
+            self.source_width = source_width
+            self.frame_seq += 1
+        if self.on_frame is not None:
+            self.on_frame()
 
-    def has_changed(self, img):
-        current_hash = imagehash.phash(img)
+    def regions(self, dirty):
+        # grow each dirty tile by the pad so neighbouring edits merge into one box
+        pad = CHANGE_REGION_PAD
+        grown = dirty.copy()
+        rows, cols = dirty.shape
+        for dy in range(-pad, pad + 1):
+            for dx in range(-pad, pad + 1):
+                grown[max(dy, 0):rows + min(dy, 0), max(dx, 0):cols + min(dx, 0)] |= \
+                    dirty[max(-dy, 0):rows + min(-dy, 0), max(-dx, 0):cols + min(-dx, 0)]
 
-        if self.last_hash is None: 
-            self.last_hash = current_hash
-            return True
+        boxes = []
+        seen = np.zeros_like(grown)
+        for r, c in zip(*np.nonzero(grown)):
+            if seen[r, c]:
+                continue
+            seen[r, c] = True
+            stack = [(r, c)]
+            top, left, bottom, right = r, c, r, c
+            while stack:
+                y, x = stack.pop()
+                top, left, bottom, right = min(top, y), min(left, x), max(bottom, y), max(right, x)
+                for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                    if 0 <= ny < rows and 0 <= nx < cols and grown[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        stack.append((ny, nx))
+            boxes.append((top, left, bottom + 1, right + 1))
+
+        if len(boxes) > CHANGE_MAX_REGIONS:
+            top, left, bottom, right = zip(*boxes)
+            boxes = [(min(top), min(left), max(bottom), max(right))]
+        return boxes
+
+    def take_changes(self):
+        # held throughout so the capture thread can't start refilling the frame being cropped
+        with self.dirty_lock:
+            dirty, frame, source_width = self.dirty, self.latest_frame, self.source_width
+            self.dirty = None
+            if frame is None:
+                return None
+            return self._changes(dirty, frame, source_width, self.latest_timestamp)
+
+    def _changes(self, dirty, frame, source_width, timestamp):
+        height, width = frame.shape[:2]
+        changes = {
+            "size": (width, height), "timestamp": timestamp,
+            "context": encode(self.context_image(frame), CONTEXT_JPEG_QUALITY), "regions": []
+        }
+        if dirty is None or not dirty.any():
+            return changes
+        if dirty.mean() > CHANGE_FULL_FRAME_RATIO:
+            return None
 
-        distance = current_hash - self.last_hash
-        self.last_hash = current_hash
+        boxes = self.regions(dirty)
+        rows, cols = dirty.shape
+        area = sum((bottom - top) * (right - left) for top, left, bottom, right in boxes)
+        if area > CHANGE_FULL_FRAME_RATIO * rows * cols:
+            return None
 
-        return distance > HASH_THRESHOLD
+        # one tile edge in capture pixels
+        tile = width * CHANGE_TILE / source_width
+        for top, left, bottom, right in boxes:
+            x, y = int(left * tile), int(top * tile)
+            w = min(int(right * tile + 0.5), width) - x
+            h = min(int(bottom * tile + 0.5), height) - y
+            changes["regions"].append({
+                "x": x, "y": y, "w": w, "h": h,
+                "data": encode(Image.fromarray(frame[y:y + h, x:x + w]))
+            })
+        return changes
 
-    def add_to_buffer(self, b64):
-        self.buffer.append(b64)
-        self.latest_b64 = b64
-        if len (self.buffer) > self.buffer_size:
-            self.buffer.pop(0)
+    def context_image(self, frame):
+        height, width = frame.shape[:2]
+        ratio = CONTEXT_WIDTH / width
+        return Image.fromarray(frame).resize((CONTEXT_WIDTH, int(height * ratio)), Image.Resampling.BILINEAR)
 
-    def get_buffer(self):
-        return self.buffer.copy()
+    def _ensure_buffers(self, size):
+        if size == self.source_size:
+            return
+        self._release_buffers()
+        width, height = size
+        out_shape = (int(height * CAPTURE_WIDTH / width), CAPTURE_WIDTH, 3)
+        if self.workers:
+            self.src_shm = shared_memory.SharedMemory(create = True, size = width * height * 4)
+            self.src_view = np.ndarray(width * height * 4, dtype = np.uint8, buffer = self.src_shm.buf)
+            for _ in range(2):
+                shm = shared_memory.SharedMemory(create = True, size = int(np.prod(out_shape)))
+                self.out_shm.append(shm)
+                self.out_views.append(np.ndarray(out_shape, dtype = np.uint8, buffer = shm.buf))
+        else:
+            self.out_views = [np.empty(out_shape, dtype = np.uint8) for _ in range(2)]
+        self.source_size = size
+
+    def _release_buffers(self):
+        with self.dirty_lock:
+            self.latest_frame = None
+            self.dirty = None
+        self.src_view = None
+        self.out_views = []
+        for shm in filter(None, [self.src_shm] + self.out_shm):
+            try:
+                shm.close()
+                shm.unlink()
+            except (BufferError, FileNotFoundError) as e:
+                print(f"[screen_capture] Could not release shared frame: {e}")
+        self.src_shm = None
+        self.out_shm = []
+        self.source_size = None
+
+    def _get_pool(self):
+        if self.pool is None:
+            # spawn, not fork: the server process has threads and an event loop running
+            self.pool = ProcessPoolExecutor(max_workers = self.workers, mp_context = multiprocessing.get_context("spawn"))
+        return self.pool
+
+    def process(self, screenshot, force = False):
+        self._ensure_buffers(screenshot.size)
+        with self.dirty_lock:
+            # never the frame take_changes may be reading
+            index = 1 if self.latest_frame is self.out_views[0] else 0
+        out = self.out_views[index]
+
+        if not self.workers:
+            current, changed, jpeg = process_frame(screenshot.raw, screenshot.size, out, self.last_hash, force)
+            return current, changed, jpeg, out
+
+        self.src_view[:] = np.frombuffer(screenshot.raw, dtype = np.uint8)
+        pool = self._get_pool()
+        try:
+            future = pool.submit(
+                process_shared, self.src_shm.name, screenshot.size,
+                self.out_shm[index].name, out.shape, self.last_hash, force
+            )
+            current, changed, jpeg = future.result()
+        except BrokenProcessPool:
+            # a dead worker poisons the executor for good; start a fresh one next tick
+            pool.shutdown(wait = False, cancel_futures = True)
+            self.pool = None
+            raise
+        return current, changed, jpeg, out
+
+    def capture (self):
+        timestamp = time.time()
+        current, _, jpeg, frame = self.process(self.grab(), force = True)
+        self.last_hash = current
+        return Image.fromarray(frame), Frame(jpeg, timestamp, current)
+
+    def add_to_buffer(self, frame):
+        self.buffer.append(frame)
+
+    def latest(self):
+        buffer = self.buffer
+        return buffer[-1] if buffer else None
+
+    def get_buffer(self, n = None):
+        # index from the end rather than iterate: the capture thread may append meanwhile
+        buffer = self.buffer
+        n = len(buffer) if n is None else min(n, len(buffer))
+        return [buffer[i] for i in range(-n, 0)]
 
     def start(self):
         self.running = True
-        thread = threading.Thread(target=self._loop, daemon=True)
-        thread.start()
+        self.wake.clear()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def tick(self):
+        timestamp = time.time()
+        screenshot = self.grab()
+        self.stats["grabbed"] += 1
+        thumb = self.thumbnail(screenshot)
+        if not self.frame_changed(thumb):
+            self.stats["skipped_static"] += 1
+            return False
+        tiles = self.dirty_tiles(thumb)
+
+        current, changed, jpeg, frame = self.process(screenshot)
+        # only advance the baseline once the frame made it through, so a failed
+        # tick is retried against the same reference
+        self.last_thumb = thumb
+        self.last_hash = current
+        self.mark_dirty(tiles, frame, screenshot.size[0], timestamp)
+        if not changed:
+            self.stats["skipped_hash"] += 1
+            return False
+        self.add_to_buffer(Frame(jpeg, timestamp, current))
+        self.stats["encoded"] += 1
+        return True
 
     def _loop(self):
         while self.running:
             try:
-                img, b64 = self.capture()
-                if self.has_changed(img):
-                    self.add_to_buffer(b64)
+                self.tick()
             except Exception as e: 
                 print(f"[screen_capture] Error: {e}")
-            time.sleep(self.interval)
+            self.wake.wait(self.interval)
 
     def set_interval(self, seconds):
         self.interval = max(1, seconds)
 
     def stop(self):
         self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout = 10)
+        if self.pool is not None:
+            self.pool.shutdown(wait = True, cancel_futures = True)
+            self.pool = None
+        self._release_buffers()
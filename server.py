@@ -1,78 +1,57 @@
 import asyncio
+import hashlib
 import json
 import time
 import random
 import threading
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles 
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 
 from config import (
-    CLAUDE_API_KEY, WHOOP_CLIENT_ID, WHOOP_CLIENT_SECRET,
+    CLAUDE_API_KEY,
     HOST, PORT,
-    GAME_MODE, CONTENT_REANALYZE_INTERVAL, CONTENT_MIN_LENGTH
+    GAME_MODE, CONTENT_REANALYZE_INTERVAL, CONTENT_MIN_LENGTH,
+    DEFAULT_USER_ID, ANALYSIS_WORKERS, STREAM_INTERVENTIONS,
+    FUSED_ANALYSIS, VISION_IDLE_INTERVAL, WHOOP_POLL_INTERVAL, BIO_TICK_INTERVAL,
+    BIO_RECLASSIFY_MIN_INTERVAL, BIO_PUSH_KEEPALIVE
 )
-if GAME_MODE: 
-    from content_analyzer import ContentAnalyzer
-else: 
+if not GAME_MODE: 
     from screen_capture import ScreenCapture
     from vision_analyzer import VisionAnalyzer
-from biometric_engine import BiometricEngine 
-from mock_biometrics import MockBiometrics 
-from ghost_brain import GhostBrain 
-from context_history import ContextTracker
+from session import SessionRegistry, normalize_user_id
+from fanout import encode
+from llm_client import close_llm_clients
+from whoop_client import get_whoop_client, close_whoop_client
+from analysis_cache import content_digest, get_analysis_cache
+from activity_store import get_activity_store, start_of_today
+from intervention_log import get_intervention_log
 from fallback_responses import get_fallback_intervention
 
-if GAME_MODE:
-    content_analyzer = ContentAnalyzer(CLAUDE_API_KEY)
-else: 
-    capture = ScreenCapture()
-    vision = VisionAnalyzer(CLAUDE_API_KEY)
-bio = BiometricEngine(WHOOP_CLIENT_ID, WHOOP_CLIENT_SECRET)
-mock = MockBiometrics()
-brain = GhostBrain(CLAUDE_API_KEY)
-tracker = ContextTracker()
-
-connected_clients: list[WebSocket] = []
-
-intervention_history: list[dict] = []
-
+# created in lifespan, not at import: spawn-based capture workers re-import this module
+capture = None
+vision = None
 ghost_running = False 
-pending_content = {}
-content_lock = threading.Lock()
-last_analyzed_hashes = {}
-intervention_cooldown_until = 0
-last_intervention_hash = None
-suppressed_hashes = {}
-mock_override_until = 0
-sleep_mode_active = False
-sleep_low_hr_count = 0
-ble_disconnected = False
-ble_disconnect_timer = None
-last_coding_activity = 0
 main_event_loop: asyncio.AbstractEventLoop = None
+analysis_queue: asyncio.Queue = None
+frame_ready: asyncio.Event = None
+vision_stats = {"analyses": 0, "frames_skipped": 0, "deliveries_skipped": 0, "frame_age": None}
+
+async def broadcast(session, message: dict):
+    await session.broadcast(message)
 
-async def broadcast(message: dict):
-    dead_clients = []
-    for client in connected_clients:
-        try: 
-            await client.send_json(message)
-        except Exception: 
-            dead_clients.append(client)
-    for client in dead_clients:
-        connected_clients.remove(client)
-
-def broadcast_sync (message: dict):
+def broadcast_sync (session, message: dict):
     if main_event_loop is None: 
         return
-    asyncio.run_coroutine_threadsafe(broadcast(message), main_event_loop)
+    main_event_loop.call_soon_threadsafe(session.publish, message)
 
-def build_biometric_msg(data, state):
-    source = "whoop" if (bio.access_token and time.time() >= mock_override_until) else "mock"
+def build_biometric_msg(session, data, state):
+    bio = session.bio
+    source = "mock" if session.using_mock() else "whoop"
     ble_active = bio.live_heart_rate > 0 and (time.time() - bio.live_hr_timestamp < 5)
-    return {
+    message = {
         "type": "biometric_update",
         "source": "ble" if ble_active else source,
         "heartRate": round(data.get("heartRate", 0)),
@@ -85,9 +64,12 @@ def build_biometric_msg(data, state):
         "spo2": round(data.get("spo2", 0), 1),
         "skinTemp": round(data.get("skinTemp", 0), 1)
     }
+    if ble_active:
+        message["live"] = bio.hr_series.summary()
+    return message
 
-def on_state_change(old_state, new_state):
-    data = mock.get_data() if (not bio.access_token or time.time() < mock_override_until) else bio.current_data or {}
+def on_state_change(session, old_state, new_state):
+    data = session.current_bio_data()
     reason = "Biometric data changed"
     if data.get("strain", 0) > 16:
         reason = "Strain over 16"
@@ -101,16 +83,18 @@ def on_state_change(old_state, new_state):
         "from": old_state, 
         "to": new_state,
         "reason": reason,
-        "estimated_stress": bio.estimated_stress
+        "estimated_stress": session.bio.estimated_stress
     }
-    broadcast_sync(message)
-    if not GAME_MODE: 
-        modifiers = bio.get_personality_modifiers(new_state)
+    broadcast_sync(session, message)
+    if capture is not None and session.user_id == DEFAULT_USER_ID: 
+        modifiers = session.bio.get_personality_modifiers(new_state)
         capture.set_interval(modifiers.get("capture_interval", 3))
 
-bio.on_state_change(on_state_change)
+def _register_session(session):
+    session.bio.on_state_change(lambda old, new: on_state_change(session, old, new))
+
+sessions = SessionRegistry(on_create = _register_session)
 
-_sim_hr = 67.0
 _SIM_HR_RANGES = {
     "RELAXED":    (62, 72),
     "DEEP_FOCUS": (65, 78),
@@ -119,223 +103,443 @@ _SIM_HR_RANGES = {
     "WIRED":      (80, 95),
 }
 
-def _simulate_hr(state):
-    global _sim_hr
+def _simulate_hr(session, state):
     lo, hi = _SIM_HR_RANGES.get(state, (62, 72))
     mid = (lo + hi) / 2
-    _sim_hr += (mid - _sim_hr) * 0.15 + random.uniform(-3, 3)
-    _sim_hr = max(lo, min(hi, _sim_hr))
-    return round(_sim_hr)
-
-def _on_ble_disconnect_timeout():
-    global sleep_mode_active
-    if ble_disconnected and not sleep_mode_active:
-        sleep_mode_active = True
-        broadcast_sync({"type": "sleep_mode", "active": True})
-        print("[bio] Sleep mode ON — BLE disconnected for 10s")
-
-def _check_sleep_mode(data):
-    global sleep_mode_active, sleep_low_hr_count
-
-    if ble_disconnected:
+    session.sim_hr += (mid - session.sim_hr) * 0.15 + random.uniform(-3, 3)
+    session.sim_hr = max(lo, min(hi, session.sim_hr))
+    return round(session.sim_hr)
+
+def _on_ble_disconnect_timeout(session):
+    if session.ble_disconnected and not session.sleep_mode_active:
+        session.sleep_mode_active = True
+        broadcast_sync(session, {"type": "sleep_mode", "active": True})
+        print(f"[bio] Sleep mode ON — BLE disconnected for 10s ({session.user_id})")
+
+def _check_sleep_mode(session, data):
+    if session.ble_disconnected:
         return
 
+    bio = session.bio
     ble_fresh = bio.live_heart_rate >= 0 and (time.time() - bio.live_hr_timestamp < 10)
     if not ble_fresh:
-        if sleep_mode_active:
-            sleep_mode_active = False
-            sleep_low_hr_count = 0
-            broadcast_sync({"type": "sleep_mode", "active": False})
-            print("[bio] Sleep mode OFF — no BLE data")
+        if session.sleep_mode_active:
+            session.sleep_mode_active = False
+            session.sleep_low_hr_count = 0
+            broadcast_sync(session, {"type": "sleep_mode", "active": False})
+            print(f"[bio] Sleep mode OFF — no BLE data ({session.user_id})")
         return
 
     hr = bio.live_heart_rate
     if hr < 50:
-        sleep_low_hr_count += 1
-        if sleep_low_hr_count >= 5 and not sleep_mode_active:
-            sleep_mode_active = True
-            broadcast_sync({"type": "sleep_mode", "active": True})
-            print(f"[bio] Sleep mode ON — low HR={hr} for {sleep_low_hr_count} cycles")
+        session.sleep_low_hr_count += 1
+        if session.sleep_low_hr_count >= 5 and not session.sleep_mode_active:
+            session.sleep_mode_active = True
+            broadcast_sync(session, {"type": "sleep_mode", "active": True})
+            print(f"[bio] Sleep mode ON — low HR={hr} for {session.sleep_low_hr_count} cycles ({session.user_id})")
     else:
-        if sleep_mode_active:
-            sleep_mode_active = False
-            broadcast_sync({"type": "sleep_mode", "active": False})
-            print(f"[bio] Sleep mode OFF — HR={hr}")
-        sleep_low_hr_count = 0
+        if session.sleep_mode_active:
+            session.sleep_mode_active = False
+            broadcast_sync(session, {"type": "sleep_mode", "active": False})
+            print(f"[bio] Sleep mode OFF — HR={hr} ({session.user_id})")
+        session.sleep_low_hr_count = 0
+
+
+def _publish_biometrics(session, data, state):
+    message = build_biometric_msg(session, data, state)
+    # the live summary drifts every sample, only the displayed fields count as a change
+    key = {k: v for k, v in message.items() if k != "live"}
+    now = time.time()
+    if key == session.last_bio_push and now - session.last_bio_push_at < BIO_PUSH_KEEPALIVE:
+        return
+    session.last_bio_push = key
+    session.last_bio_push_at = now
+    broadcast_sync(session, message)
 
 
-def biometric_loop():
-    global last_coding_activity
-    while ghost_running:
-        is_whoop = False
-        if time.time() < mock_override_until:
-            data = mock.get_data()
-        elif bio.access_token:
-            data = bio.fetch_data()
-            if data is None:
-                data = mock.get_data()
-            else:
-                is_whoop = True
+def _reclassify_live(session):
+    session.reclassify_handle = None
+    session.last_reclassify = time.monotonic()
+    bio = session.bio
+    data = session.current_bio_data()
+    if not data:
+        return
+    if bio.live_heart_rate:
+        data["heartRate"] = bio.live_heart_rate
+    state = bio.classify(data)
+    invalidate_status(session)
+    _publish_biometrics(session, data, state)
+
+
+def schedule_reclassify(session):
+    if session.reclassify_handle is not None:
+        return
+    wait = session.last_reclassify + BIO_RECLASSIFY_MIN_INTERVAL - time.monotonic()
+    if wait <= 0:
+        _reclassify_live(session)
+    else:
+        # samples landing inside the window fold into this one run
+        session.reclassify_handle = main_event_loop.call_later(wait, _reclassify_live, session)
+
+
+async def _biometric_tick(session):
+    bio = session.bio
+    is_whoop = False
+    if time.time() < session.mock_override_until or not bio.access_token:
+        data = session.mock.get_data()
+    else:
+        if time.time() >= session.next_whoop_poll:
+            session.next_whoop_poll = time.time() + WHOOP_POLL_INTERVAL
+            await bio.fetch_data()
+        data = bio.current_data
+        if data is None:
+            data = session.mock.get_data()
         else:
-            data = mock.get_data()
+            is_whoop = True
 
-        if data:
-            ble_fresh = bio.live_heart_rate and (time.time() - bio.live_hr_timestamp < 5)
-            if ble_fresh:
-                data["heartRate"] = bio.live_heart_rate
-            elif is_whoop:
-                pre_state = bio.classify(data)
-                data["heartRate"] = _simulate_hr(pre_state)
+    if data:
+        ble_fresh = bio.live_heart_rate and (time.time() - bio.live_hr_timestamp < 5)
+        if ble_fresh:
+            data["heartRate"] = bio.live_heart_rate
+        elif is_whoop:
+            pre_state = bio.classify(data)
+            data["heartRate"] = _simulate_hr(session, pre_state)
 
-            state = bio.classify(data)
+        state = bio.classify(data)
 
-            if is_whoop:
-                src = "ble" if ble_fresh else "whoop"
-                print(f"[bio] WHOOP state classified: {state} (rec={data.get('recovery')}, strain={data.get('strain')}, hrv={data.get('hrv')}, hr={data.get('heartRate')}, src={src})")
+        if is_whoop:
+            src = "ble" if ble_fresh else "whoop"
+            print(f"[bio] WHOOP state classified: {state} (rec={data.get('recovery')}, strain={data.get('strain')}, hrv={data.get('hrv')}, hr={data.get('heartRate')}, src={src}, user={session.user_id})")
 
-            biometric_msg = build_biometric_msg(data, state)
-            broadcast_sync(biometric_msg)
+        _publish_biometrics(session, data, state)
 
-        _check_sleep_mode(data)
+    _check_sleep_mode(session, data)
 
-        if last_coding_activity > 0 and time.time() - last_coding_activity > 60:
-            last_coding_activity = time.time()
-            broadcast_sync({"type": "plant_update", "delta": -2})
+    if session.last_coding_activity > 0 and time.time() - session.last_coding_activity > 60:
+        session.last_coding_activity = time.time()
+        broadcast_sync(session, {"type": "plant_update", "delta": -2})
 
-        time.sleep(5)
+    invalidate_status(session)
 
 
-def ghost_loop():
-    global intervention_cooldown_until, last_intervention_hash
-    time.sleep(2)
+async def biometric_loop():
+    while ghost_running:
+        started = time.monotonic()
+        active = sessions.all()
+        results = await asyncio.gather(*(_biometric_tick(s) for s in active), return_exceptions = True)
+        for session, result in zip(active, results):
+            if isinstance(result, Exception):
+                print(f"[bio] Tick failed for {session.user_id}: {result}")
+        sessions.reap()
+        await asyncio.sleep(max(0, BIO_TICK_INTERVAL - (time.monotonic() - started)))
+
+
+def build_status(session):
+    bio = session.bio
+    brain = session.brain
+    bio_data = session.current_bio_data()
+    last_analysis = session.last_analysis() if GAME_MODE else vision.last_analysis
 
+    return {
+        "user": session.user_id,
+        "biometric_state": bio.current_state, 
+        "biometric_data": bio_data, 
+        "last_analysis": last_analysis,
+        "interventions_total": brain.intervention_count, 
+        "interventions_accepted": brain.accepted_count,
+        "interventions_ignored": brain.ignored_count,
+        "session_stats": session.tracker.get_session_stats(),
+        "mock_mode": session.using_mock(),
+        "whoop_connected": bio.access_token is not None,
+        "estimated_stress": bio.estimated_stress,
+        "hrv_baseline": bio.hrv_baseline,
+        "hrv_current": bio_data.get("hrv", 0),
+        "game_mode": GAME_MODE,
+        "current_app": last_analysis.get("app") if GAME_MODE and last_analysis else None,
+        "analysis_cache": get_analysis_cache().stats() if GAME_MODE else None,
+        "vision": None if GAME_MODE else dict(vision_stats),
+    }
+
+
+def _status_frame(session):
+    return f'{{"type":"status_snapshot","etag":{json.dumps(session.status_etag)},"status":{session.status_body}}}'
+
+
+def refresh_status(session):
+    body = encode(build_status(session))
+    etag = '"' + hashlib.blake2b(body.encode("utf-8"), digest_size = 8).hexdigest() + '"'
+    changed = etag != session.status_etag
+    session.status_body = body
+    session.status_etag = etag
+    session.status_dirty = False
+    if changed:
+        frame = _status_frame(session)
+        for channel in list(session.clients):
+            if channel.wants_status:
+                channel.push("status_snapshot", frame)
+
+
+def invalidate_status(session):
+    # rebuilt now only if someone is subscribed, otherwise on the next GET
+    session.status_dirty = True
+    if any(channel.wants_status for channel in session.clients):
+        refresh_status(session)
+
+
+async def record_intervention(session, intervention, app_type = None):
+    session.last_intervention_id = intervention.get("id")
+    log = get_intervention_log()
+    await log.run(asyncio.get_running_loop(), log.append, session.user_id, intervention, app_type)
+
+
+async def record_feedback(session, action, intervention_id = None):
+    session.brain.user_feedback(action)
+    log = get_intervention_log()
+    await log.run(asyncio.get_running_loop(), log.add_feedback, session.user_id, intervention_id, action,
+                  fallback_id = session.last_intervention_id)
+
+
+def enqueue_analysis(session):
+    # one queue entry per session: its worker drains every pending app, so a busy user holds one worker at most
+    if analysis_queue is None or session.analysis_queued:
+        return
+    session.analysis_queued = True
+    analysis_queue.put_nowait(session)
+
+
+async def deliver_intervention(session, analysis, state, modifiers, app_type = None):
+    extra = {"biometric": build_biometric_msg(session, session.current_bio_data(), state)}
+    if app_type:
+        extra["app_type"] = app_type
+
+    if not STREAM_INTERVENTIONS:
+        intervention = await session.brain.process(analysis, state, modifiers)
+        if intervention:
+            intervention.update(extra)
+            await broadcast(session, intervention)
+        return intervention
+
+    intervention = None
+    async for frame in session.brain.process_stream(analysis, state, modifiers):
+        if frame["type"] == "intervention_start":
+            frame.update(extra)
+        elif frame["type"] == "intervention_end":
+            frame.update(extra)
+            intervention = dict(frame, type = "intervention")
+        await broadcast(session, frame)
+    return intervention
+
+
+async def _analyze_content(session, app_type):
+    content_data = session.pending_content.pop(app_type, None)
+    if not content_data or len(content_data.get("content", "")) < CONTENT_MIN_LENGTH:
+        return
+
+    bio = session.bio
+    state = bio.current_state
+    modifiers = bio.get_personality_modifiers(state)
+
+    content_hash = content_digest(content_data["content"])
+
+    already_analyzed = content_hash == session.last_analyzed_hashes.get(app_type)
+    in_cooldown = time.time() < session.intervention_cooldown_until
+    user_suppressed = session.suppressed_hashes.get(content_hash, 0) > time.time()
+    if already_analyzed or in_cooldown or user_suppressed:
+        return
+
+    context_summary = session.tracker.get_summary()
+    fused = {"biometric_state": state, "modifiers": modifiers} if FUSED_ANALYSIS else {}
+    try:
+        analysis = await session.content_analyzer.analyze(
+            app_type=app_type,
+            content=content_data["content"],
+            extra_context=context_summary or "",
+            **fused,
+            **content_data.get("kwargs", {})
+        )
+    except Exception as e:
+        print(f"[pipeline] Content analysis failed: {e}")
+        return
+    session.last_analyzed_hashes[app_type] = content_hash
+
+    if not analysis:
+        return
+
+    session.tracker.update(analysis, state, bio.estimated_stress)
+    invalidate_status(session)
+    intervention = await deliver_intervention(session, analysis, state, modifiers, app_type)
+
+    if intervention:
+        session.intervention_cooldown_until = time.time() + 8
+        session.last_intervention_hash = content_hash
+        session.last_analyzed_hashes.clear()
+        await record_intervention(session, intervention, app_type)
+        print(f"[ghost] ({session.user_id}/{state}/{app_type}) {intervention['message'][:80]}...")
+
+        plant_delta = -25 if intervention.get("priority") == "critical" else -15
+        await broadcast(session, {"type": "plant_update", "delta": plant_delta})
+    else:
+        await broadcast(session, {"type": "plant_update", "delta": 10})
+
+
+async def analysis_worker(worker_id):
+    while True:
+        session = await analysis_queue.get()
+        app_type = None
+        try:
+            # drain what was pending on pickup; anything newer goes back behind the other users
+            for app_type in list(session.pending_content):
+                await _analyze_content(session, app_type)
+        except Exception as e:
+            print(f"[pipeline] Worker {worker_id} error ({session.user_id}/{app_type}): {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            session.analysis_queued = False
+            if session.pending_content:
+                enqueue_analysis(session)
+            analysis_queue.task_done()
+
+
+def _collect_frames(use_changes):
+    frames = capture.get_buffer(2)
+    changes = capture.take_changes()
+    # crops only make sense against an earlier full-frame read of the screen
+    if not use_changes:
+        changes = None
+    # full frames are only base64'd when they're what gets sent
+    screenshots = [frame.b64() for frame in frames] if changes is None else []
+    return screenshots, frames, changes
+
+
+async def _deliver_vision(session, analysis, state, modifiers):
+    try:
+        intervention = await deliver_intervention(session, analysis, state, modifiers)
+    except Exception as e:
+        print(f"[ghost_loop] Intervention failed: {e}")
+        return
+    if intervention:
+        await record_intervention(session, intervention)
+        print(f"[ghost] ({state}) {intervention['message'][:80]}...")
+
+
+async def _vision_tick(session):
+    bio = session.bio
+    state = bio.current_state
+    modifiers = bio.get_personality_modifiers(state)
+
+    # crops and base64 are CPU work, keep them off the event loop
+    screenshots, frames, changes = await asyncio.to_thread(_collect_frames, vision.last_analysis is not None)
+
+    if not screenshots and changes is None:
+        return None
+
+    captured_at = changes["timestamp"] if changes else frames[-1].timestamp
+    context_summary = session.tracker.get_summary()
+
+    try:
+        analysis = await vision.analyze(screenshots, context_summary, changes = changes)
+    except Exception as e:
+        print(f"[ghost_loop] Vision analysis failed: {e}")
+        await asyncio.sleep(modifiers.get("capture_interval", 3))
+        return None
+
+    vision_stats["analyses"] += 1
+    vision_stats["frame_age"] = round(time.time() - captured_at, 2)
+    session.tracker.update(analysis, state, bio.estimated_stress)
+    invalidate_status(session)
+    return analysis, state, modifiers
+
+
+def _frame_captured():
+    loop = main_event_loop
+    if loop is not None and frame_ready is not None:
+        loop.call_soon_threadsafe(frame_ready.set)
+
+
+async def vision_loop():
+    await asyncio.sleep(2)
+
+    session = sessions.get_or_create(DEFAULT_USER_ID)
+    analyzed_seq = capture.frame_seq
+    delivery = None
     while ghost_running:
+        # single-slot handoff: however many frames landed during the last call,
+        # only the newest gets analyzed; a static screen is re-checked now and then
         try:
-            state = bio.current_state
-            modifiers = bio.get_personality_modifiers(state)
-
-            if GAME_MODE:
-                analysis = None
-                app_type = None
-                content_data = None
-                content_hash = None
-
-                with content_lock:
-                    latest_time = 0
-                    for atype, data in pending_content.items():
-                        if data["timestamp"] > latest_time:
-                            latest_time = data["timestamp"]
-                            app_type = atype
-                            content_data = data
-
-                if content_data and len(content_data.get("content", "")) >= CONTENT_MIN_LENGTH:
-                    content_hash = hash(content_data["content"][:500])
-
-                    already_analyzed = content_hash == last_analyzed_hashes.get(app_type)
-                    in_cooldown = time.time() < intervention_cooldown_until
-                    user_suppressed = suppressed_hashes.get(content_hash, 0) > time.time()
-
-                    if already_analyzed or in_cooldown or user_suppressed:
-                        with content_lock:
-                            if app_type in pending_content:
-                                del pending_content[app_type]
-                    else:
-                        context_summary = tracker.get_summary()
-                        try:
-                            analysis = content_analyzer.analyze(
-                                app_type=app_type,
-                                content=content_data["content"],
-                                extra_context=context_summary or "",
-                                **content_data.get("kwargs", {})
-                            )
-                            last_analyzed_hashes[app_type] = content_hash
-                            with content_lock:
-                                if app_type in pending_content:
-                                    del pending_content[app_type]
-                        except Exception as e:
-                            print(f"[ghost_loop] Content analysis failed: {e}")
-
-                if analysis:
-                    tracker.update(analysis, state, bio.estimated_stress)
-                    intervention = brain.process(analysis, state, modifiers)
-
-                    if intervention:
-                        intervention_cooldown_until = time.time() + 8
-                        last_intervention_hash = content_hash
-                        last_analyzed_hashes.clear()
-                        bio_data = mock.get_data() if (not bio.access_token or time.time() < mock_override_until) else (bio.current_data or {})
-                        intervention["biometric"] = build_biometric_msg(bio_data, state)
-                        intervention["app_type"] = app_type
-                        broadcast_sync(intervention)
-                        intervention_history.append(intervention)
-                        if len(intervention_history) > 50:
-                            intervention_history.pop(0)
-                        print(f"[ghost] ({state}/{app_type}) {intervention['message'][:80]}...")
-
-                        plant_delta = -25 if intervention.get("priority") == "critical" else -15
-                        broadcast_sync({"type": "plant_update", "delta": plant_delta})
-                    else:
-                        broadcast_sync({"type": "plant_update", "delta": 10})
-
-            else:
-                screenshots = capture.get_buffer()
-
-                if not screenshots:
-                    time.sleep(1)
-                    continue
-
-                context_summary = tracker.get_summary()
-
-                try:
-                    analysis = vision.analyze(screenshots, context_summary)
-                except Exception as e:
-                    print(f"[ghost_loop] Vision analysis failed: {e}")
-                    time.sleep(modifiers.get("capture_interval", 3))
-                    continue
-
-                tracker.update(analysis, state, bio.estimated_stress)
-
-                intervention = brain.process(analysis, state, modifiers)
-
-                if intervention:
-                    bio_data = mock.get_data() if (not bio.access_token or time.time() < mock_override_until) else (bio.current_data or {})
-                    intervention["biometric"] = build_biometric_msg(bio_data, state)
-                    broadcast_sync(intervention)
-                    intervention_history.append(intervention)
-                    if len(intervention_history) > 50:
-                        intervention_history.pop(0)
-                    print(f"[ghost] ({state}) {intervention['message'][:80]}...")
+            await asyncio.wait_for(frame_ready.wait(), VISION_IDLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        frame_ready.clear()
+        seq = capture.frame_seq
+        if seq - analyzed_seq > 1:
+            vision_stats["frames_skipped"] += seq - analyzed_seq - 1
+        analyzed_seq = seq
 
+        try:
+            result = await _vision_tick(session)
         except Exception as e:
             print(f"[ghost_loop] Error: {e}")
             import traceback
             traceback.print_exc()
-        time.sleep(1)
+            await asyncio.sleep(1)
+            continue
+        if result is None:
+            continue
+
+        # the next analysis starts while this one's intervention streams; an analysis
+        # that finishes while a delivery is still running is too stale to act on
+        if delivery is None or delivery.done():
+            delivery = asyncio.create_task(_deliver_vision(session, *result))
+        else:
+            vision_stats["deliveries_skipped"] += 1
+
+    if delivery is not None:
+        delivery.cancel()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI): 
-    global ghost_running, main_event_loop
+    global ghost_running, main_event_loop, analysis_queue, frame_ready, capture, vision
     ghost_running = True
+    sessions.get_or_create(DEFAULT_USER_ID)
 
     main_event_loop = asyncio.get_event_loop()
+    workers = []
+    vision_task = None
     if not GAME_MODE:
+        frame_ready = asyncio.Event()
+        capture = ScreenCapture()
+        vision = VisionAnalyzer(CLAUDE_API_KEY)
+        capture.on_frame = _frame_captured
         capture.start()
         print("[ghost] Screen capture started")
     else:
-        print("[ghost] Game mode. waiting for content from PixiJS frontend")
+        analysis_queue = asyncio.Queue()
+        workers = [asyncio.create_task(analysis_worker(i)) for i in range(ANALYSIS_WORKERS)]
+        print(f"[ghost] Game mode. waiting for content from PixiJS frontend ({ANALYSIS_WORKERS} analysis workers)")
     
-    bio_thread = threading.Thread(target = biometric_loop, daemon = True)
-    bio_thread.start()
-    ghost_thread = threading.Thread(target = ghost_loop, daemon = True)
-    ghost_thread.start()
-    print(f"[ghost] Ghost loop started")
+    bio_task = asyncio.create_task(biometric_loop())
+    if not GAME_MODE:
+        vision_task = asyncio.create_task(vision_loop())
+        print(f"[ghost] Ghost loop started")
     print(f"[ghost] Server running on http://{HOST}:{PORT}")
     yield
     
     ghost_running = False
+    bio_task.cancel()
+    for worker in workers:
+        worker.cancel()
+    analysis_queue = None
+    if vision_task is not None:
+        vision_task.cancel()
     if not GAME_MODE: 
+        capture.on_frame = None
         capture.stop()
+        frame_ready = None
+    await asyncio.to_thread(get_activity_store().flush)
+    await close_llm_clients()
+    await close_whoop_client()
     main_event_loop = None
     print("[ghost] Shutting down")
     
@@ -346,28 +550,22 @@ app.mount("/public", StaticFiles(directory="public"), name="public")
 
 @app.get ("/health")
 async def health():
-    return {"status": "alive", "ghost": "watching"}
+    return {"status": "alive", "ghost": "watching", "sessions": len(sessions.all())}
 
-@app.get("/api/status")
-async def status():
-    bio_data = mock.get_data() if (not bio.access_token or time.time() < mock_override_until) else (bio.current_data or {})
+def unknown_user(user):
+    return JSONResponse(status_code = 404, content = {"error": f"No active session for user '{normalize_user_id(user)}'"})
 
-    return {
-        "biometric_state": bio.current_state, 
-        "biometric_data": bio_data, 
-        "last_analysis": content_analyzer.last_analysis if GAME_MODE else vision.last_analysis,
-        "interventions_total": brain.intervention_count, 
-        "interventions_accepted": brain.accepted_count,
-        "interventions_ignored": brain.ignored_count,
-        "session_stats": tracker.get_session_stats(),
-        "mock_mode": not bio.access_token or time.time() < mock_override_until,
-        "whoop_connected": bio.access_token is not None,
-        "estimated_stress": bio.estimated_stress,
-        "hrv_baseline": bio.hrv_baseline,
-        "hrv_current": bio_data.get("hrv", 0),
-        "game_mode": GAME_MODE,
-        "current_app": content_analyzer.last_analysis.get("app") if GAME_MODE and content_analyzer.last_analysis else None,
-    }
+@app.get("/api/status")
+async def status(request: Request, user: str = DEFAULT_USER_ID):
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
+    if session.status_dirty or session.status_body is None:
+        refresh_status(session)
+    headers = {"ETag": session.status_etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == session.status_etag:
+        return Response(status_code = 304, headers = headers)
+    return Response(content = session.status_body, media_type = "application/json", headers = headers)
 
 @app.post("/api/biometric/mock")
 async def set_mock_state (body:dict):
@@ -378,11 +576,15 @@ async def set_mock_state (body:dict):
             content = {"error": "state must be 1-5"}
         )
 
-    mock.set_state(state_num)
+    session = sessions.get(body.get("user"))
+    if session is None:
+        return unknown_user(body.get("user"))
+    session.mock.set_state(state_num)
 
     await asyncio.sleep(0.3)
-    data = mock.get_data()
-    new_state = bio.classify(data)
+    data = session.mock.get_data()
+    new_state = session.bio.classify(data)
+    invalidate_status(session)
 
     return {
         "ok": True, 
@@ -393,13 +595,51 @@ async def set_mock_state (body:dict):
 
 @app.post("/api/feedback")
 async def user_feedback(body: dict):
+    session = sessions.get(body.get("user"))
+    if session is None:
+        return unknown_user(body.get("user"))
+    brain = session.brain
     action = body.get("action", "")
-    brain.user_feedback(action)
+    await record_feedback(session, action, body.get("intervention_id"))
     return {"ok": True, "accepted": brain.accepted_count, "ignored": brain.ignored_count}
 
 @app.get("/api/history")
-async def get_history(): 
-    return {"interventions": intervention_history[-20:]}
+async def get_history(user: str = DEFAULT_USER_ID, limit: int = 20, cursor: int = None,
+                      state: str = None, app_type: str = None, reason: str = None,
+                      priority: str = None, feedback: str = None,
+                      since: float = None, until: float = None):
+    # persisted history outlives sessions, so this reads by user id and never builds one
+    log = get_intervention_log()
+    interventions, next_cursor = await log.run(
+        asyncio.get_running_loop(), log.query, normalize_user_id(user), cursor = cursor, limit = limit, feedback = feedback, since = since, until = until,
+        state = state, app_type = app_type, reason = reason, priority = priority
+    )
+    return {"interventions": interventions, "next_cursor": next_cursor}
+
+
+@app.get("/api/activity")
+async def get_activity(user: str = DEFAULT_USER_ID, range: str = "hour", app_type: str = None, state: str = None):
+    user_id = normalize_user_id(user)
+    now = time.time()
+    since = {
+        "hour": now - 3600,
+        "today": start_of_today(now),
+        "day": now - 86400,
+        "week": now - 7 * 86400,
+    }.get(range)
+    if since is None:
+        return JSONResponse(status_code = 400, content = {"error": "range must be hour, today, day or week"})
+    store = get_activity_store()
+    summary = await asyncio.to_thread(store.summary, user_id, since, now)
+    timeline = await asyncio.to_thread(store.timeline, user_id, since, now, app = app_type, state = state)
+    recent = await asyncio.to_thread(store.entries, user_id, since, now, app = app_type, state = state, limit = 20)
+    return {
+        "user": user_id,
+        "range": range,
+        "summary": summary,
+        "timeline": timeline,
+        "recent": recent
+    }
 
 
 @app.get("/api/game/apps")
@@ -415,102 +655,130 @@ async def get_game_apps():
         }
     }
 
+WHOOP_AUTH_STATE = "devlife_whoop_auth_2026"
+
 @app.get("/api/whoop/auth")
-async def whoop_auth():
+async def whoop_auth(user: str = DEFAULT_USER_ID):
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
     redirect_uri = "http://localhost:8000/api/whoop/callback"
-    auth_url = bio.get_auth_url(redirect_uri)
+    auth_url = session.bio.get_auth_url(redirect_uri, state = f"{WHOOP_AUTH_STATE}:{session.user_id}")
     return RedirectResponse(url=auth_url)
 
 @app.get("/api/whoop/callback")
-async def whoop_callback(code: str = None, error: str = None):
+async def whoop_callback(code: str = None, error: str = None, state: str = None):
     if error or not code:
         return JSONResponse({"error": error or "No code received"}, status_code=400)
+    user = None
+    if state and state.startswith(f"{WHOOP_AUTH_STATE}:"):
+        user = state.split(":", 1)[1]
+    # the login redirect already required a live session, so a forged state can't mint one here
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
     redirect_uri = "http://localhost:8000/api/whoop/callback"
-    success = bio.exchange_token(code, redirect_uri)
+    success = session.bio.exchange_token(code, redirect_uri)
     if success:
         return RedirectResponse(url="http://localhost:5173")
     return JSONResponse({"error": "Token exchange failed"}, status_code=500)
 
 @app.get("/api/whoop/status")
-async def whoop_status():
-    connected = bio.access_token is not None
+async def whoop_status(user: str = DEFAULT_USER_ID):
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
+    connected = session.bio.access_token is not None
     return JSONResponse({
         "connected": connected,
         "source": "whoop" if connected else "mock",
+        "rate_budget": get_whoop_client().budget.stats(),
     })
 
 @app.get("/api/test/sleep")
-async def test_sleep():
-    global ble_disconnected, sleep_mode_active
-    ble_disconnected = True
-    sleep_mode_active = True
-    for ws in connected_clients:
-        await ws.send_json({"type": "sleep_mode", "active": True})
+async def test_sleep(user: str = DEFAULT_USER_ID):
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
+    session.ble_disconnected = True
+    session.sleep_mode_active = True
+    await broadcast(session, {"type": "sleep_mode", "active": True})
     return {"status": "sleep mode activated"}
 
 @app.get("/api/test/wake")
-async def test_wake():
-    global ble_disconnected, sleep_mode_active
-    ble_disconnected = False
-    sleep_mode_active = False
-    for ws in connected_clients:
-        await ws.send_json({"type": "sleep_mode", "active": False})
+async def test_wake(user: str = DEFAULT_USER_ID):
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
+    session.ble_disconnected = False
+    session.sleep_mode_active = False
+    await broadcast(session, {"type": "sleep_mode", "active": False})
     return {"status": "sleep mode deactivated"}
 
 @app.get("/api/test/plant/grow")
-async def test_plant_grow():
-    for ws in connected_clients:
-        await ws.send_json({"type": "plant_update", "delta": 25})
+async def test_plant_grow(user: str = DEFAULT_USER_ID):
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
+    await broadcast(session, {"type": "plant_update", "delta": 25})
     return {"status": "plant growing"}
 
 @app.get("/api/test/plant/die")
-async def test_plant_die():
-    for ws in connected_clients:
-        await ws.send_json({"type": "plant_update", "delta": -25})
+async def test_plant_die(user: str = DEFAULT_USER_ID):
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
+    await broadcast(session, {"type": "plant_update", "delta": -25})
     return {"status": "plant dying"}
 
 @app.get("/api/test/plant/bloom")
-async def test_plant_bloom():
-    for ws in connected_clients:
-        await ws.send_json({"type": "plant_update", "health": 100})
+async def test_plant_bloom(user: str = DEFAULT_USER_ID):
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
+    await broadcast(session, {"type": "plant_update", "health": 100})
     return {"status": "plant blooming"}
 
 @app.get("/api/test/plant/kill")
-async def test_plant_kill():
-    for ws in connected_clients:
-        await ws.send_json({"type": "plant_update", "health": 0})
+async def test_plant_kill(user: str = DEFAULT_USER_ID):
+    session = sessions.get(user)
+    if session is None:
+        return unknown_user(user)
+    await broadcast(session, {"type": "plant_update", "health": 0})
     return {"status": "plant dead"}
 
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
-    global suppressed_hashes, intervention_cooldown_until, mock_override_until, ble_disconnected, ble_disconnect_timer, sleep_mode_active, sleep_low_hr_count, last_coding_activity
     await ws.accept()
-    connected_clients.append(ws)
-    print(f"[ws] Client connected ({len(connected_clients)} total)")
+    session, channel = sessions.attach(ws.query_params.get("user"), ws)
+    bio = session.bio
+    mock = session.mock
+    brain = session.brain
+    print(f"[ws] Client connected to '{session.user_id}' ({len(session.clients)} in session, {sessions.client_count()} total)")
 
-    bio_data = mock.get_data() if (not bio.access_token or time.time() < mock_override_until) else (bio.current_data or {})
-    await ws.send_json(build_biometric_msg(bio_data, bio.current_state))
+    channel.send(build_biometric_msg(session, session.current_bio_data(), bio.current_state))
 
     try:
         while True:
             data = await ws.receive_json()
+            session.last_seen = time.time()
 
             if data.get("type") == "feedback":
                 action = data.get("action", "")
-                brain.user_feedback(action)
+                await record_feedback(session, action, data.get("intervention_id"))
                 if action == "Apply Fix":
-                    intervention_cooldown_until = 0
-                    last_analyzed_hashes.clear()
-                    suppressed_hashes.clear()
-                    await broadcast({"type": "plant_update", "delta": 20})
+                    session.intervention_cooldown_until = 0
+                    session.last_analyzed_hashes.clear()
+                    session.suppressed_hashes.clear()
+                    await broadcast(session, {"type": "plant_update", "delta": 20})
                 else:
-                    if last_intervention_hash is not None:
-                        suppressed_hashes[last_intervention_hash] = time.time() + 10
+                    if session.last_intervention_hash is not None:
+                        session.suppressed_hashes[session.last_intervention_hash] = time.time() + 10
                         now = time.time()
-                        suppressed_hashes = {h: t for h, t in suppressed_hashes.items() if t > now}
+                        session.suppressed_hashes = {h: t for h, t in session.suppressed_hashes.items() if t > now}
 
             elif data.get("type") == "content_update":
-                last_coding_activity = time.time()
+                session.last_coding_activity = time.time()
                 app_type = data.get("app_type", "code")
                 content = data.get("content", "")
                 kwargs = {}
@@ -524,65 +792,80 @@ async def websocket_endpoint(ws: WebSocket):
                     kwargs["shell"] = data["shell"]
                 if data.get("platform"):
                     kwargs["platform"] = data["platform"]
-                with content_lock:
-                    pending_content[app_type] = {
-                        "content": content,
-                        "timestamp": time.time(),
-                        "changed": True,
-                        "kwargs": kwargs
-                    }
+                session.pending_content[app_type] = {
+                    "content": content,
+                    "timestamp": time.time(),
+                    "changed": True,
+                    "kwargs": kwargs
+                }
+                enqueue_analysis(session)
             
             elif data.get("type") == "mock_state":
                 state_num = data.get("state")
                 if state_num in [1, 2, 3, 4, 5]:
                     mock.set_state(state_num)
-                    mock_override_until = time.time() + 30
+                    session.mock_override_until = time.time() + 30
                     data_now = mock.get_data()
                     new_state = bio.classify(data_now)
-                    await ws.send_json(build_biometric_msg(data_now, new_state))
-                    intervention_cooldown_until = 0
-                    last_analyzed_hashes.clear()
-                    suppressed_hashes.clear()
+                    channel.send(build_biometric_msg(session, data_now, new_state))
+                    session.intervention_cooldown_until = 0
+                    session.last_analyzed_hashes.clear()
+                    session.suppressed_hashes.clear()
                     brain.last_intervention_time = 0
             
             elif data.get("type") == "live_hr":
                 live_hr = data.get("heart_rate", 0)
                 if 30 < live_hr < 220:
-                    bio.live_heart_rate = live_hr
-                    bio.live_hr_timestamp = time.time()
+                    rr = data.get("rr")
+                    rr = [v for v in rr if isinstance(v, (int, float)) and 250 <= v <= 2500] if isinstance(rr, list) else []
+                    bio.add_live_hr(live_hr, rr)
+                    schedule_reclassify(session)
+
+            elif data.get("type") == "live_hr_batch":
+                if bio.add_live_hr_batch(data.get("t") or [], data.get("hr") or [], data.get("rr")):
+                    schedule_reclassify(session)
 
             elif data.get("type") == "ble_disconnected":
-                ble_disconnected = True
-                if ble_disconnect_timer:
-                    ble_disconnect_timer.cancel()
-                ble_disconnect_timer = threading.Timer(10.0, _on_ble_disconnect_timeout)
-                ble_disconnect_timer.daemon = True
-                ble_disconnect_timer.start()
-                print("[ws] BLE disconnected — 10s sleep timer started")
+                session.ble_disconnected = True
+                if session.ble_disconnect_timer:
+                    session.ble_disconnect_timer.cancel()
+                session.ble_disconnect_timer = threading.Timer(10.0, _on_ble_disconnect_timeout, args = (session,))
+                session.ble_disconnect_timer.daemon = True
+                session.ble_disconnect_timer.start()
+                print(f"[ws] BLE disconnected — 10s sleep timer started ({session.user_id})")
 
             elif data.get("type") == "ble_reconnected":
-                ble_disconnected = False
-                if ble_disconnect_timer:
-                    ble_disconnect_timer.cancel()
-                    ble_disconnect_timer = None
-                if sleep_mode_active:
-                    sleep_mode_active = False
-                    sleep_low_hr_count = 0
-                    broadcast_sync({"type": "sleep_mode", "active": False})
-                    print("[bio] Sleep mode OFF — BLE reconnected")
+                session.ble_disconnected = False
+                if session.ble_disconnect_timer:
+                    session.ble_disconnect_timer.cancel()
+                    session.ble_disconnect_timer = None
+                if session.sleep_mode_active:
+                    session.sleep_mode_active = False
+                    session.sleep_low_hr_count = 0
+                    await broadcast(session, {"type": "sleep_mode", "active": False})
+                    print(f"[bio] Sleep mode OFF — BLE reconnected ({session.user_id})")
+
+            elif data.get("type") == "subscribe_status":
+                channel.wants_status = bool(data.get("enabled", True))
+                if channel.wants_status:
+                    if session.status_dirty or session.status_body is None:
+                        refresh_status(session)
+                    channel.push("status_snapshot", _status_frame(session))
 
             elif data.get("type") == "app_focus":
                 app_type = data.get("app_type")
                 if app_type:
-                    broadcast_sync({
+                    await broadcast(session, {
                         "type": "app_focus_change",
                         "app_type": app_type,
                         "timestamp": time.time()
                     })
 
     except WebSocketDisconnect:
-        connected_clients.remove(ws)
-        print (f"[ws]Client offline({len(connected_clients)} total)")
+        pass
+    finally:
+        sessions.detach(session, channel)
+    print (f"[ws]Client offline from '{session.user_id}' ({sessions.client_count()} total)")
 
 if __name__ == "__main__": 
     import uvicorn
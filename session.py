@@ -0,0 +1,162 @@
+import re
+import threading
+import time
+
+from config import (
+    CLAUDE_API_KEY, WHOOP_CLIENT_ID, WHOOP_CLIENT_SECRET,
+    GAME_MODE, DEFAULT_USER_ID, SESSION_IDLE_TIMEOUT
+)
+from biometric_engine import BiometricEngine
+from mock_biometrics import MockBiometrics
+from ghost_brain import GhostBrain
+from context_history import ContextTracker
+from activity_store import get_activity_store
+from fanout import ClientChannel, encode
+if GAME_MODE:
+    from content_analyzer import ContentAnalyzer
+
+_USER_ID_RE = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def normalize_user_id(user_id):
+    if not user_id:
+        return DEFAULT_USER_ID
+    cleaned = _USER_ID_RE.sub("", str(user_id))[:64]
+    return cleaned or DEFAULT_USER_ID
+
+
+class Session:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.clients = []
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+
+        tokens_file = None
+        history_file = None
+        if user_id != DEFAULT_USER_ID:
+            tokens_file = BiometricEngine.TOKENS_FILE.replace(".json", f".{user_id}.json")
+            history_file = BiometricEngine.HISTORY_FILE.replace(".json", f".{user_id}.json")
+        self.bio = BiometricEngine(WHOOP_CLIENT_ID, WHOOP_CLIENT_SECRET, tokens_file=tokens_file, history_file=history_file)
+        self.mock = MockBiometrics()
+        self.brain = GhostBrain(CLAUDE_API_KEY, session_id = user_id)
+        self.tracker = ContextTracker(store = get_activity_store(), user_id = user_id)
+        self.content_analyzer = ContentAnalyzer(CLAUDE_API_KEY, session_id = user_id) if GAME_MODE else None
+
+        self.last_intervention_id = None
+        self.pending_content = {}
+        self.analysis_queued = False
+        self.last_analyzed_hashes = {}
+        self.intervention_cooldown_until = 0
+        self.last_intervention_hash = None
+        self.suppressed_hashes = {}
+        self.mock_override_until = 0
+        self.sleep_mode_active = False
+        self.sleep_low_hr_count = 0
+        self.ble_disconnected = False
+        self.ble_disconnect_timer = None
+        self.last_coding_activity = 0
+        self.sim_hr = 67.0
+        self.next_whoop_poll = 0
+        self.last_reclassify = 0
+        self.reclassify_handle = None
+        self.last_bio_push = None
+        self.last_bio_push_at = 0
+        self.status_body = None
+        self.status_etag = None
+        self.status_dirty = True
+
+    def using_mock(self):
+        return not self.bio.access_token or time.time() < self.mock_override_until
+
+    def current_bio_data(self):
+        if self.using_mock():
+            return self.mock.get_data()
+        return self.bio.current_data or {}
+
+    def last_analysis(self):
+        if self.content_analyzer is not None:
+            return self.content_analyzer.last_analysis
+        return None
+
+    def publish(self, message):
+        if not self.clients:
+            return
+        text = encode(message)
+        msg_type = message.get("type")
+        for channel in list(self.clients):
+            channel.push(msg_type, text)
+
+    async def broadcast(self, message):
+        self.publish(message)
+
+    def _drop_channel(self, channel):
+        if channel in self.clients:
+            self.clients.remove(channel)
+
+    def close(self):
+        for channel in list(self.clients):
+            channel.close()
+        if self.ble_disconnect_timer:
+            self.ble_disconnect_timer.cancel()
+            self.ble_disconnect_timer = None
+        if self.reclassify_handle:
+            self.reclassify_handle.cancel()
+            self.reclassify_handle = None
+
+
+class SessionRegistry:
+    def __init__(self, on_create = None):
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.on_create = on_create
+
+    def get(self, user_id):
+        return self.sessions.get(normalize_user_id(user_id))
+
+    def get_or_create(self, user_id):
+        user_id = normalize_user_id(user_id)
+        with self.lock:
+            session = self.sessions.get(user_id)
+            if session is None:
+                session = Session(user_id)
+                self.sessions[user_id] = session
+                created = True
+            else:
+                created = False
+        if created and self.on_create:
+            self.on_create(session)
+        return session
+
+    def attach(self, user_id, ws):
+        session = self.get_or_create(user_id)
+        channel = ClientChannel(ws, on_close = session._drop_channel).start()
+        session.clients.append(channel)
+        session.last_seen = time.time()
+        return session, channel
+
+    def detach(self, session, channel):
+        channel.close(close_socket = False)
+        session.last_seen = time.time()
+
+    def all(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    def client_count(self):
+        return sum(len(s.clients) for s in self.all())
+
+    def reap(self, idle_seconds = SESSION_IDLE_TIMEOUT):
+        now = time.time()
+        removed = []
+        with self.lock:
+            for user_id, session in list(self.sessions.items()):
+                if user_id == DEFAULT_USER_ID or session.clients:
+                    continue
+                if now - session.last_seen > idle_seconds:
+                    del self.sessions[user_id]
+                    removed.append(session)
+        for session in removed:
+            session.close()
+            print(f"[session] Dropped idle session '{session.user_id}'")
+        return removed
@@ -0,0 +1,120 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANALYSIS = {
+    "app": "code_editor",
+    "language": "python",
+    "activity": "debugging",
+    "stuck_probability": 0.3,
+    "stuck_reason": None,
+    "mistake_detected": True,
+    "mistake_description": "Attribute access on a value that can be None",
+    "help_opportunity": "Point at the missing None check",
+    "risky_action": False,
+    "risky_description": None,
+    "suggested_intervention": {
+        "type": "fix",
+        "message": "That call can return None — guard it before reading .price.",
+        "priority": "high",
+        "code_suggestion": None
+    },
+    "context_summary": "Debugging a None dereference"
+}
+CANNED_MESSAGE = "Line 3 reads .price from something that can be None. Add a guard before the loop and you're set."
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.3
+    token_delay = 0.02
+    requests = 0
+
+    def do_POST(self):
+        StubHandler.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+        system = str(body.get("system", ""))
+        if "JSON" in system:
+            analysis = dict(CANNED_ANALYSIS)
+            if "ghost_message" in system:
+                analysis["ghost_message"] = CANNED_MESSAGE
+            text = json.dumps(analysis)
+        else:
+            text = CANNED_MESSAGE
+
+        time.sleep(self.latency)
+        if body.get("stream"):
+            self._stream(body, text)
+        else:
+            self._reply(body, text)
+
+    def _message(self, body, content, stop_reason, output_tokens):
+        return {
+            "id": f"msg_stub_{StubHandler.requests}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {"input_tokens": 1, "output_tokens": output_tokens}
+        }
+
+    def _reply(self, body, text):
+        payload = json.dumps(self._message(body, [{"type": "text", "text": text}], "end_turn", len(text.split()))).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _event(self, name, data):
+        chunk = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, body, text):
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        words = text.split(" ")
+        self._event("message_start", {"type": "message_start", "message": self._message(body, [], None, 0)})
+        self._event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for i, word in enumerate(words):
+            delta = word if i == len(words) - 1 else word + " "
+            self._event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": delta}})
+            time.sleep(self.token_delay)
+        self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": len(words)}})
+        self._event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port = 0, latency = 0.3, token_delay = 0.02):
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"latency": latency, "token_delay": token_delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Local stand-in for the Anthropic Messages API")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--latency", type = float, default = 0.3, help = "seconds before the first byte")
+    parser.add_argument("--token-delay", type = float, default = 0.02, help = "seconds between streamed words")
+    args = parser.parse_args()
+    server = start_stub(args.port, args.latency, args.token_delay)
+    print(f"[stub_llm] Listening on http://127.0.0.1:{server.server_address[1]} (latency {args.latency}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,36 +1,78 @@
+import sys
 import time 
+import asyncio
 from config import CLAUDE_API_KEY
 from screen_capture import ScreenCapture
 from vision_analyzer import VisionAnalyzer
-from biometric_engine import BiometricEngine
+from biometric_engine import BiometricEngine, classify_batch
+from hr_series import HeartRateSeries
 from mock_biometrics import MockBiometrics
 from ghost_brain import GhostBrain
 from context_history import ContextTracker
 
+def check_classify_parity():
+    bio = BiometricEngine()
+    print("[0] Batch classifier parity...")
+    rows = []
+    for recovery in (20, 45, 65, 85):
+        for strain in (4, 9, 13, 17):
+            for sleep in (0.6, 0.9):
+                for hrv in (25, 45, 55, 70):
+                    for live in (0, 55, 70, 80, 100, 115):
+                        rows.append((recovery, strain, sleep, hrv, live))
+    baseline = 65.0
+    columns = list(zip(*rows))
+    states, stress = classify_batch(*columns[:4], hrv_baseline = baseline, live_hr = columns[4])
+    mismatches = 0
+    for i, (recovery, strain, sleep, hrv, live) in enumerate(rows):
+        bio.hrv_baseline = baseline
+        bio.hr_series = HeartRateSeries()
+        if live:
+            bio.add_live_hr(live)
+        state = bio.classify({"recovery": recovery, "strain": strain, "sleepPerformance": sleep, "hrv": hrv})
+        if state != states[i] or bio.estimated_stress != stress[i]:
+            mismatches += 1
+            print(f"    MISMATCH {rows[i]}: classify={state}/{bio.estimated_stress} batch={states[i]}/{stress[i]}")
+    print(f" {len(rows)} rows, {mismatches} mismatches")
+    print(f"    (expected: 0 mismatches)")
+    print()
+    return mismatches
+
+
 def main():
     print("=" * 50)
     print(" Ghost - component test")
     print("=" * 50)
     print()
 
-    capture = ScreenCapture()
+    # runs first: it needs no display or API key, and must not be skipped
+    if check_classify_parity():
+        return 1
+
     vision = VisionAnalyzer(CLAUDE_API_KEY)
     mock = MockBiometrics()
     bio = BiometricEngine()
     brain = GhostBrain(CLAUDE_API_KEY)
     tracker = ContextTracker()
+    loop = asyncio.new_event_loop()
 
     print ("[1] Capturing screen...")
+    capture = None
     try: 
-        img, b64 = capture.capture()
-        capture.add_to_buffer(b64)
-        print(f"  Screenshot captured: {len(b64):,} bytes (base64)")
+        capture = ScreenCapture()
+        img, frame = capture.capture()
+        capture.add_to_buffer(frame)
+        b64 = frame.b64()
+        print(f"  Screenshot captured: {len(frame.jpeg):,} bytes (JPEG), {len(b64):,} bytes (base64)")
         print(f" Image size: {img.size}")
         print(f" Buffer size: {len(capture.get_buffer())}")
     except Exception as e: 
         print(f" Error: {e}")
         print(" (This may fail in headless environments)")
         return 
+    finally:
+        if capture is not None:
+            capture.stop()
     print()
 
     if not CLAUDE_API_KEY: 
@@ -54,7 +96,7 @@ def main():
     else: 
         print("[2] Analyzing with Claude Vision...")
         try: 
-            analysis = vision.analyze([b64])
+            analysis = loop.run_until_complete(vision.analyze([b64]))
             print(f" App: {analysis.get('app')}")
             print(f" Activity: {analysis.get('activity')}")
             print(f"    Stuck probability: {analysis.get('stuck_probability')}")
@@ -87,7 +129,7 @@ def main():
         brain.last_intervention_time = 0
 
         if CLAUDE_API_KEY: 
-            result = brain.process(analysis, state, modifiers)
+            result = loop.run_until_complete(brain.process(analysis, state, modifiers))
             if result: 
                 msg = result["message"][:100]
                 if len(result["message"]) > 100:
@@ -161,7 +203,7 @@ def main():
     result = calculate_total (None)
     print(result)""" 
         try: 
-            result = content.analyze("code", sample_code, language = "python", cursor_line = 8)
+            result = loop.run_until_complete(content.analyze("code", sample_code, language = "python", cursor_line = 8))
             print(f" Code analysis:")
             print(f"      Activity: {result.get('activity')}")
             print(f"      Mistake: {result.get('mistake_detected')} — {result.get('mistake_description', 'none')}")
@@ -178,7 +220,7 @@ error TS2307: Cannot find module './components/Ghost'
 $ npm run build
 error TS2307: Cannot find module './components/Ghost'"""
         try: 
-            result = content.analyze("terminal", sample_terminal, shell = "bash")
+            result = loop.run_until_complete(content.analyze("terminal", sample_terminal, shell = "bash"))
             print(f" Terminal analysis:")
             print(f" Activity: {result.get('activity')}")
             print(f" Stuck: {result.get('stuck_probability')}")
@@ -197,4 +239,4 @@ error TS2307: Cannot find module './components/Ghost'"""
     print("=" * 50)
 
 if __name__ == "__main__": 
-    main()
+    sys.exit(main())
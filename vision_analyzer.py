@@ -1,11 +1,13 @@
 
 
-import anthropic 
 import json
 from config import VISION_MODEL, VISION_MAX_TOKENS
+from llm_client import get_llm_client
 
 VISION_SYSTEM_PROMPT = """ You are Ghost, an AI desktop analyst. You receive 
-screenshots of a user's computer screen. 
+screenshots of a user's computer screen. When only part of the screen changed
+you receive a low-resolution view of the whole screen plus full-resolution
+crops of the changed regions, with their coordinates on the full screen.
 Analyze and respond with ONLY a JSON object (no markdown, no explanation):
 {
     "app": "string - what application is open (vscode, email, slack, cursor
@@ -45,17 +47,54 @@ Help opportunities
 - debugging = could spot the fix """
 
 class VisionAnalyzer:
-    def __init__(self, api_key):
-        self.client = anthropic.Anthropic(api_key = api_key)
+    def __init__(self, api_key, session_id = None):
+        self.client = get_llm_client(api_key)
+        self.session_id = session_id
         self.last_analysis = None
     
-    def analyze(self, screenshots_b64, context_history = None):
+    def _image(self, b64):
+        return {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": "image/jpeg",
+                "data": b64
+            }
+        }
+
+    def _change_content(self, changes):
+        width, height = changes["size"]
+        content = []
+        if self.last_analysis and self.last_analysis.get("context_summary"):
+            content.append({
+                "type": "text",
+                "text": f"Previous analysis: {self.last_analysis['context_summary']}"
+            })
+        content.append({
+            "type": "text",
+            "text": f"[Current screen, low resolution. Full screen is {width}x{height}]"
+        })
+        content.append(self._image(changes["context"]))
+        if not changes["regions"]:
+            content.append({"type": "text", "text": "[Nothing on screen changed since the previous capture]"})
+        for region in changes["regions"]:
+            content.append({
+                "type": "text",
+                "text": f"[Changed region at x={region['x']} y={region['y']} w={region['w']} h={region['h']}, full resolution]"
+            })
+            content.append(self._image(region["data"]))
+        return content
+
+    async def analyze(self, screenshots_b64, context_history = None, changes = None):
         content = []
         if context_history: 
             content.append({
                 "type": "text", 
                 "text": f"Recent activity context: {context_history}" 
             })
+        if changes is not None:
+            content.extend(self._change_content(changes))
+            screenshots_b64 = []
         for i, b64 in enumerate (screenshots_b64[-2:]):
             if i == 0  and len(screenshots_b64) > 1:
                 label = "Previous screenshot"
@@ -65,21 +104,15 @@ class VisionAnalyzer:
                 "type": "text",
                 "text": f"[{label}]"
             })
-            content.append({
-                "type": "image", 
-                "source": {
-                    "type": "base64", 
-                    "media_type": "image/jpeg",
-                    "data": b64
-                }
-            })
+            content.append(self._image(b64))
         content.append({
             "type": "text",
             "text": "analyze what the user is doing. respond with only a JSON object, no markdown"
 
         })
 
-        response = self.client.messages.create(
+        response = await self.client.create(
+            session_id = self.session_id,
             model = VISION_MODEL,
             max_tokens = VISION_MAX_TOKENS,
             system = VISION_SYSTEM_PROMPT, 
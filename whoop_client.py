@@ -0,0 +1,102 @@
+import time
+
+import httpx
+
+from config import (
+    WHOOP_RATE_LIMIT_PER_MIN, WHOOP_RATE_LIMIT_PER_DAY, WHOOP_RATE_HEADROOM,
+    WHOOP_DAILY_BURST, WHOOP_TIMEOUT, WHOOP_MAX_CONNECTIONS
+)
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens
+
+
+class RateBudget:
+    def __init__(self, per_minute = WHOOP_RATE_LIMIT_PER_MIN, per_day = WHOOP_RATE_LIMIT_PER_DAY,
+                 headroom = WHOOP_RATE_HEADROOM, daily_burst = WHOOP_DAILY_BURST):
+        minute = per_minute * headroom
+        day = per_day * headroom
+        # the daily bucket only holds a small burst so polls spread across the
+        # day instead of draining the allowance in the first couple of hours
+        self.buckets = [
+            TokenBucket(minute / 60, minute),
+            TokenBucket(day / 86400, min(day, daily_burst))
+        ]
+        self.paused_until = 0
+        self.granted = 0
+        self.denied = 0
+
+    def try_acquire(self, n = 1):
+        now = time.monotonic()
+        if now < self.paused_until or any(b.available(now) < n for b in self.buckets):
+            self.denied += 1
+            return False
+        for bucket in self.buckets:
+            bucket.tokens -= n
+        self.granted += n
+        return True
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        print(f"[whoop] Rate limited — pausing API calls for {seconds:.0f}s")
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "minute_tokens": round(self.buckets[0].available(now), 1),
+            "day_tokens": round(self.buckets[1].available(now), 1),
+            "granted": self.granted,
+            "denied": self.denied,
+            "paused": now < self.paused_until
+        }
+
+
+class WhoopClient:
+    def __init__(self, timeout = WHOOP_TIMEOUT, max_connections = WHOOP_MAX_CONNECTIONS):
+        self.budget = RateBudget()
+        self.http = httpx.AsyncClient(
+            timeout = timeout,
+            limits = httpx.Limits(max_connections = max_connections, max_keepalive_connections = max_connections)
+        )
+
+    async def get(self, url, token, params = None):
+        if not self.budget.try_acquire():
+            return None
+        response = await self.http.get(url, headers = {"Authorization": f"Bearer {token}"}, params = params)
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get("retry-after", 60))
+            except ValueError:
+                retry_after = 60
+            self.budget.pause(retry_after)
+        return response
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+_client = None
+
+def get_whoop_client():
+    global _client
+    if _client is None:
+        _client = WhoopClient()
+    return _client
+
+async def close_whoop_client():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,127 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import WHOOP_HISTORY_DAYS, WHOOP_PAGE_SIZE
+
+# cycles first: recovery records have no start time of their own, so both
+# endpoints are queried from the start of the newest cycle
+ENDPOINTS = ("cycle", "recovery")
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _slim(endpoint, record):
+    score = record.get("score") or {}
+    if endpoint == "cycle":
+        return record.get("id"), {
+            "start": record.get("start"),
+            "end": record.get("end"),
+            "score_state": record.get("score_state"),
+            "strain": score.get("strain")
+        }
+    return record.get("cycle_id"), {
+        "created_at": record.get("created_at"),
+        "score_state": record.get("score_state"),
+        "recovery": score.get("recovery_score"),
+        "hrv": score.get("hrv_rmssd_milli"),
+        "rhr": score.get("resting_heart_rate")
+    }
+
+
+class WhoopHistory:
+    def __init__(self, path, days = WHOOP_HISTORY_DAYS):
+        self.path = path
+        self.days = days
+        self.records = {endpoint: {} for endpoint in ENDPOINTS}
+        self.cursor = None
+        self.last_sync = 0
+        self._load()
+
+    def _load(self):
+        try:
+            if not os.path.exists(self.path):
+                return
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            for endpoint in ENDPOINTS:
+                self.records[endpoint] = data.get(endpoint, {})
+            self.cursor = data.get("cursor")
+        except Exception as e:
+            print(f"[whoop] Failed to load history: {e}")
+
+    def _save(self):
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"cursor": self.cursor, **self.records}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"[whoop] Failed to save history: {e}")
+
+    def _cycle_start(self, cycle_id):
+        cycle = self.records["cycle"].get(str(cycle_id))
+        return cycle.get("start") if cycle else None
+
+    def _prune(self):
+        cutoff = _iso(datetime.now(timezone.utc) - timedelta(days = self.days))
+        cycles = self.records["cycle"]
+        for key in [k for k, c in cycles.items() if (c.get("start") or "") < cutoff]:
+            del cycles[key]
+        recoveries = self.records["recovery"]
+        for key in [k for k in recoveries if k not in cycles]:
+            del recoveries[key]
+
+    async def _sync_endpoint(self, client, url, token, start):
+        params = {"limit": WHOOP_PAGE_SIZE, "start": start}
+        fetched = 0
+        while True:
+            response = await client.get(url, token, params = params)
+            if response is None or response.status_code != 200:
+                return fetched, False
+            data = response.json()
+            endpoint = url.rsplit("/", 1)[1]
+            for record in data.get("records", []):
+                key, slim = _slim(endpoint, record)
+                if key is not None:
+                    self.records[endpoint][str(key)] = slim
+                    fetched += 1
+            next_token = data.get("next_token")
+            if not next_token:
+                return fetched, True
+            params = {"limit": WHOOP_PAGE_SIZE, "start": start, "nextToken": next_token}
+
+    async def sync(self, client, api_base, token):
+        start = self.cursor or _iso(datetime.now(timezone.utc) - timedelta(days = self.days))
+        fetched = 0
+        complete = True
+        for endpoint in ENDPOINTS:
+            count, done = await self._sync_endpoint(client, f"{api_base}/{endpoint}", token, start)
+            fetched += count
+            complete = complete and done
+        self.last_sync = time.time()
+
+        if complete:
+            # the newest cycle is still open (and its recovery may still be
+            # pending), so the cursor stays on it and it gets refetched next time
+            starts = [c.get("start") for c in self.records["cycle"].values() if c.get("start")]
+            if starts:
+                self.cursor = max(starts)
+        if fetched:
+            self._prune()
+            self._save()
+            print(f"[whoop] History synced: {fetched} records, {len(self.daily_hrv())} scored days")
+        return complete
+
+    def daily_hrv(self, window = None):
+        days = []
+        for cycle_id, recovery in self.records["recovery"].items():
+            if recovery.get("score_state") != "SCORED" or not recovery.get("hrv"):
+                continue
+            days.append((self._cycle_start(cycle_id) or recovery.get("created_at") or "", recovery["hrv"]))
+        days.sort()
+        values = [hrv for _, hrv in days]
+        return values[-window:] if window else values